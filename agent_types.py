@@ -1,8 +1,10 @@
-from dataclasses import dataclass
-from typing import Optional, List, Dict, Any, Tuple
+from collections import deque
+from types import MappingProxyType
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Any, Deque, NamedTuple
 from datetime import datetime
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MarketState:
     """Pregame market state for volatility analysis."""
     event_id: int
@@ -14,7 +16,7 @@ class MarketState:
     implied_vol: float  # σᵢᵥ from Polson-Stern
     odds_data: str  # Raw odds data for reference
 
-@dataclass
+@dataclass(slots=True)
 class LiveMarketState:
     """Live market state incorporating Polson-Stern variables."""
     event_id: int
@@ -28,7 +30,7 @@ class LiveMarketState:
     live_vol: float  # Time-varying σᵢᵥ,ₜ
     expected_vol: Optional[float] = None  # Expected σₑ,ₜ if available
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class VolSignal:
     """Trading signal based on volatility analysis."""
     event_id: int
@@ -45,7 +47,7 @@ class VolSignal:
     expected_vol: Optional[float] = None
     vol_diff: Optional[float] = None  # |σᵢᵥ,ₜ - σₑ,ₜ|
 
-@dataclass
+@dataclass(slots=True)
 class TradePosition:
     """Active trade position."""
     event_id: int
@@ -67,7 +69,7 @@ class TradePosition:
     exit_time: Optional[str] = None
     exit_reason: Optional[str] = None
 
-@dataclass
+@dataclass(slots=True)
 class TradeDecision:
     """LLM-enhanced trading decision."""
     event_id: int
@@ -82,7 +84,7 @@ class TradeDecision:
     hold_time: Optional[float] = None  # max minutes to hold
     confidence: Optional[float] = None  # 0-1 confidence score
 
-@dataclass
+@dataclass(slots=True)
 class ActionPlan:
     """Trading action plan generated by the agent."""
     event_id: int
@@ -92,9 +94,10 @@ class ActionPlan:
     size: float
     rationale: str
     volatility_data: Dict[str, Any]
-    timestamp: str = datetime.utcnow().isoformat()
+    # Evaluated per instance; a plain default would be frozen at import time
+    timestamp: str = field(default_factory=lambda: datetime.utcnow().isoformat())
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ExecutionResult:
     """Result of executing a trading action."""
     success: bool
@@ -104,21 +107,18 @@ class ExecutionResult:
 class AgentMemory:
     """Memory store for agent's past actions and context."""
     def __init__(self):
-        self.actions: List[ActionPlan] = []
-        self.executions: List[ExecutionResult] = []
         self.max_memory = 100  # Keep last 100 actions
+        # Bounded deques drop the oldest entry in O(1) once full
+        self.actions: Deque[ActionPlan] = deque(maxlen=self.max_memory)
+        self.executions: Deque[ExecutionResult] = deque(maxlen=self.max_memory)
         
     def add_action(self, action: ActionPlan):
         """Add an action to memory."""
         self.actions.append(action)
-        if len(self.actions) > self.max_memory:
-            self.actions.pop(0)
             
     def add_execution(self, result: ExecutionResult):
         """Add an execution result to memory."""
         self.executions.append(result)
-        if len(self.executions) > self.max_memory:
-            self.executions.pop(0)
             
     def get_recent_context(self, n: int = 5) -> List[Dict]:
         """Get recent actions and their results for context."""
@@ -128,15 +128,22 @@ class AgentMemory:
                 "result": result
             }
             for action, result in zip(
-                self.actions[-n:],
-                self.executions[-n:]
+                list(self.actions)[-n:],
+                list(self.executions)[-n:]
             )
         ]
 
+def position_key(event_id: int, side_index: int) -> int:
+    """Pack (event_id, side_index) into one int; side_index must be 0 or 1."""
+    if side_index not in (0, 1):
+        # Any other value would silently collide with another position's key
+        raise ValueError(f"side_index must be 0 or 1, got {side_index!r}")
+    return (event_id << 1) | side_index
+
 class AgentState:
     """Current state of the agent."""
     def __init__(self):
-        self.active_positions: Dict[Tuple[int, int], Dict] = {}  # (event_id, side_index) -> position
+        self.active_positions: Dict[int, Dict] = {}  # position_key(event_id, side_index) -> position
         self.position_size: float = 0.1  # Default 10% of capital per trade
         self.min_confidence: float = 0.7  # Minimum confidence threshold
         self.error_count: int = 0
@@ -145,15 +152,15 @@ class AgentState:
         
     def can_take_new_position(self, event_id: int, side_index: int) -> bool:
         """Check if we can take a new position."""
-        return (event_id, side_index) not in self.active_positions
+        return position_key(event_id, side_index) not in self.active_positions
         
     def add_position(self, event_id: int, side_index: int, position: Dict):
         """Add a new position."""
-        self.active_positions[(event_id, side_index)] = position
+        self.active_positions[position_key(event_id, side_index)] = position
         
     def remove_position(self, event_id: int, side_index: int):
         """Remove a position."""
-        self.active_positions.pop((event_id, side_index), None)
+        self.active_positions.pop(position_key(event_id, side_index), None)
         
     def record_error(self):
         """Record an error occurrence."""
@@ -163,24 +170,36 @@ class AgentState:
         """Record a successful operation."""
         self.success_count += 1
 
-# League-specific parameters
-LEAGUE_PARAMS = {
-    "NFL": {
+class LeagueParams(NamedTuple):
+    """Per-league constants; attribute access skips the per-key dict lookups."""
+    total_minutes: float
+    vol_threshold: float
+    size_multiplier: float
+    max_hold_time: float  # minutes
+
+# League-specific parameters (read-only; shared by every importer)
+LEAGUE_PARAMS = MappingProxyType({
+    "NFL": MappingProxyType({
         "total_minutes": 60,
         "vol_threshold": 2.0,
         "size_multiplier": 1.0,
         "max_hold_time": 15.0
-    },
-    "NBA": {
+    }),
+    "NBA": MappingProxyType({
         "total_minutes": 48,
         "vol_threshold": 1.5,
         "size_multiplier": 0.8,
         "max_hold_time": 12.0
-    },
-    "CBB": {
+    }),
+    "CBB": MappingProxyType({
         "total_minutes": 40,
         "vol_threshold": 1.8,
         "size_multiplier": 0.6,
         "max_hold_time": 10.0
-    }
-} 
\ No newline at end of file
+    })
+})
+
+# The same parameters as LeagueParams, for readers that want attribute access
+LEAGUE_TUPLES = MappingProxyType({
+    league: LeagueParams(**params) for league, params in LEAGUE_PARAMS.items()
+})
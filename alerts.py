@@ -1,9 +1,58 @@
 import os
+import math
 import logging
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Optional
 from datetime import datetime
 
+# Alert bodies are built once here rather than re-parsed as f-strings per alert
+_ENTRY_TMPL = """
+🚨 <b>New Trade Alert</b>
+
+Event: {event_id} ({league})
+Matchup: {matchup}
+Side: {team}
+Price: {price_str}
+Action: {direction}
+Size: ${size:.2f}
+Game Clock: {game_clock}
+Score Diff: {score_diff:+.1f}
+
+<b>Volatility Analysis</b>
+Live Vol: {live_vol:.2f}
+Expected Vol: {expected_vol:.2f}
+Deviation: {deviation}
+Confidence: {confidence:.1%}
+
+<b>Market State</b>
+Current Prob: {current_prob:.3f}
+Timestamp: {ts}
+"""
+
+_EXIT_TMPL = """
+💰 <b>Position Closed</b>
+
+Event: {event_id} ({league})
+Matchup: {matchup}
+Side: {team}
+Exit Price: {price_str}
+Type: {position_type}
+Exit Reason: {reason}
+PnL: {pnl_emoji} ${pnl:+,.2f}
+Total PnL: ${total_pnl:+,.2f}
+Game Clock: {game_clock}
+Score Diff: {score_diff:+.1f}
+
+<b>Final State</b>
+Live Vol: {live_vol:.2f}
+Expected Vol: {expected_vol:.2f}
+Deviation: {deviation}
+Current Prob: {current_prob:.3f}
+Timestamp: {ts}
+"""
+
 class AlertManager:
     """Manages trade alerts via Telegram."""
     
@@ -12,8 +61,26 @@ class AlertManager:
         self.chat_id = os.getenv('TELEGRAM_CHAT_ID')
         self.enabled = bool(self.bot_token and self.chat_id)
         
+        self._session = None
+        self._send_url = None
+
         if not self.enabled:
             logging.warning("Telegram alerts disabled: Missing BOT_TOKEN or CHAT_ID")
+            return
+
+        # Reuse one connection to api.telegram.org across alerts
+        self._session = requests.Session()
+        # sendMessage isn't idempotent: only retry when the connection never
+        # opened, since a read timeout or 5xx may follow a delivered alert
+        retry = Retry(
+            total=3,
+            connect=3,
+            read=0,
+            status=0,
+            backoff_factor=0.25
+        )
+        self._session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=retry))
+        self._send_url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
     
     def send_alert(self, msg: str) -> bool:
         """Send alert message to Telegram."""
@@ -21,13 +88,12 @@ class AlertManager:
             return False
             
         try:
-            url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
             data = {
                 "chat_id": self.chat_id,
                 "text": msg,
                 "parse_mode": "HTML"
             }
-            response = requests.post(url, data=data, timeout=5)
+            response = self._session.post(self._send_url, data=data, timeout=5)
             response.raise_for_status()
             return True
             
@@ -35,25 +101,22 @@ class AlertManager:
             logging.error(f"Failed to send Telegram alert: {str(e)}")
             return False
     
-    def format_entry_alert(
+    def _alert_context(
         self,
         event_id: int,
         league: str,
         side_index: int,
-        direction: str,
-        size: float,
-        confidence: float,
         live_vol: float,
         expected_vol: float,
         score_diff: float,
         current_prob: float,
-        game_clock: Optional[str] = None,
-        home_team: Optional[str] = None,
-        away_team: Optional[str] = None,
-        home_price: Optional[float] = None,
-        away_price: Optional[float] = None
-    ) -> str:
-        """Format entry alert message."""
+        game_clock: Optional[str],
+        home_team: Optional[str],
+        away_team: Optional[str],
+        home_price: Optional[float],
+        away_price: Optional[float]
+    ) -> dict:
+        """Build the template fields shared by entry and exit alerts."""
         # Format team matchup
         if home_team and away_team:
             matchup = f"{away_team} @ {home_team}"
@@ -68,30 +131,51 @@ class AlertManager:
             team = away_team or "Away"
             price = away_price
             
-        price_str = f"${price:.2f}" if price is not None else "N/A"
-        
-        return f"""
-🚨 <b>New Trade Alert</b>
-
-Event: {event_id} ({league})
-Matchup: {matchup}
-Side: {team}
-Price: {price_str}
-Action: {direction}
-Size: ${size:.2f}
-Game Clock: {game_clock or "N/A"}
-Score Diff: {score_diff:+.1f}
-
-<b>Volatility Analysis</b>
-Live Vol: {live_vol:.2f}
-Expected Vol: {expected_vol:.2f}
-Deviation: {((live_vol - expected_vol) / expected_vol * 100):.1f}%
-Confidence: {confidence:.1%}
-
-<b>Market State</b>
-Current Prob: {current_prob:.3f}
-Timestamp: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}
-"""
+        # Dead or stale markets can report expected_vol as 0 or NaN
+        dev_pct = (live_vol - expected_vol) / expected_vol * 100 if expected_vol else float('nan')
+            
+        return {
+            "event_id": event_id,
+            "league": league,
+            "matchup": matchup,
+            "team": team,
+            "price_str": f"${price:.2f}" if price is not None else "N/A",
+            "game_clock": game_clock or "N/A",
+            "score_diff": score_diff,
+            "live_vol": live_vol,
+            "expected_vol": expected_vol,
+            "deviation": f"{dev_pct:.1f}%" if math.isfinite(dev_pct) else "N/A",
+            "current_prob": current_prob,
+            "ts": datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')
+        }
+    
+    def format_entry_alert(
+        self,
+        event_id: int,
+        league: str,
+        side_index: int,
+        direction: str,
+        size: float,
+        confidence: float,
+        live_vol: float,
+        expected_vol: float,
+        score_diff: float,
+        current_prob: float,
+        game_clock: Optional[str] = None,
+        home_team: Optional[str] = None,
+        away_team: Optional[str] = None,
+        home_price: Optional[float] = None,
+        away_price: Optional[float] = None
+    ) -> str:
+        """Format entry alert message."""
+        ctx = self._alert_context(
+            event_id, league, side_index, live_vol, expected_vol, score_diff,
+            current_prob, game_clock, home_team, away_team, home_price, away_price
+        )
+        ctx["direction"] = direction
+        ctx["size"] = size
+        ctx["confidence"] = confidence
+        return _ENTRY_TMPL.format_map(ctx)
     
     def format_exit_alert(
         self,
@@ -113,43 +197,14 @@ Timestamp: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}
         away_price: Optional[float] = None
     ) -> str:
         """Format exit alert message."""
-        # Format team matchup
-        if home_team and away_team:
-            matchup = f"{away_team} @ {home_team}"
-        else:
-            matchup = "Teams N/A"
-            
-        # Get price for selected side
-        if side_index == 1:  # Home
-            team = home_team or "Home"
-            price = home_price
-        else:  # Away
-            team = away_team or "Away"
-            price = away_price
-            
-        price_str = f"${price:.2f}" if price is not None else "N/A"
-        
+        ctx = self._alert_context(
+            event_id, league, side_index, live_vol, expected_vol, score_diff,
+            current_prob, game_clock, home_team, away_team, home_price, away_price
+        )
+        ctx["position_type"] = position_type
+        ctx["reason"] = reason
+        ctx["pnl"] = pnl
+        ctx["total_pnl"] = total_pnl
         # Format PnL with color indicators
-        pnl_emoji = "🟢" if pnl > 0 else "🔴" if pnl < 0 else "⚪️"
-        
-        return f"""
-💰 <b>Position Closed</b>
-
-Event: {event_id} ({league})
-Matchup: {matchup}
-Side: {team}
-Exit Price: {price_str}
-Type: {position_type}
-Exit Reason: {reason}
-PnL: {pnl_emoji} ${pnl:+,.2f}
-Total PnL: ${total_pnl:+,.2f}
-Game Clock: {game_clock or "N/A"}
-Score Diff: {score_diff:+.1f}
-
-<b>Final State</b>
-Live Vol: {live_vol:.2f}
-Expected Vol: {expected_vol:.2f}
-Deviation: {((live_vol - expected_vol) / expected_vol * 100):.1f}%
-Current Prob: {current_prob:.3f}
-Timestamp: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}
-""" 
\ No newline at end of file
+        ctx["pnl_emoji"] = "🟢" if pnl > 0 else "🔴" if pnl < 0 else "⚪️"
+        return _EXIT_TMPL.format_map(ctx)
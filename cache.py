@@ -0,0 +1,81 @@
+"""
+In-process TTL cache for API lookups
+"""
+
+import time
+import functools
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Marks a key with no cached entry, so falsy results can be cached too
+_MISSING = object()
+
+def ttl_cache(ttl: float, maxsize: int = 1024, cache_if: Optional[Callable[[Any], bool]] = None):
+    """
+    Cache a function's results for ttl seconds, keyed on its arguments.
+
+    Every return value is cached, empty ones included, unless cache_if is
+    given and returns False for it; exceptions are never cached, so a
+    raising call is retried next time. Concurrent misses on the same key
+    share one call: the first caller runs it and the rest wait for its result.
+    When full, expired entries are dropped first, then the oldest.
+    The wrapped function gets a cache_clear() method.
+    """
+    def decorator(func):
+        cache: Dict[Any, Tuple[float, Any]] = {}
+        inflight: Dict[Any, Future] = {}
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+            with lock:
+                hit = cache.get(key, _MISSING)
+                if hit is not _MISSING and hit[0] > time.monotonic():
+                    return hit[1]
+                pending = inflight.get(key)
+                if pending is None:
+                    pending = inflight[key] = Future()
+                    owner = True
+                else:
+                    owner = False
+
+            if not owner:
+                # Re-raises the owner's exception if its call failed
+                return pending.result()
+
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                with lock:
+                    del inflight[key]
+                pending.set_exception(e)
+                raise
+
+            if cache_if is not None and not cache_if(result):
+                # Waiters still share this result; it just isn't kept
+                with lock:
+                    del inflight[key]
+                pending.set_result(result)
+                return result
+
+            with lock:
+                now = time.monotonic()
+                if key not in cache and len(cache) >= maxsize:
+                    for stale in [k for k, (expires, _) in cache.items() if expires <= now]:
+                        del cache[stale]
+                    if len(cache) >= maxsize:
+                        del cache[next(iter(cache))]  # oldest insert
+                cache[key] = (now + ttl, result)
+                del inflight[key]
+            pending.set_result(result)
+            return result
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
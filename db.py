@@ -0,0 +1,41 @@
+"""
+Shared Postgres connection pool
+"""
+
+import os
+import threading
+import psycopg2.pool
+from contextlib import contextmanager
+
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 10
+
+# Created on first use so importing a module doesn't open connections.
+# The DSN is read then too, after the entry script has run load_dotenv
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                dsn = os.getenv("DATABASE_URL") or os.getenv("POSTGRES_URL")
+                if not dsn:
+                    raise ValueError("Postgres connection string not found in environment variables. Please set DATABASE_URL or POSTGRES_URL in your .env file.")
+                _pool = psycopg2.pool.ThreadedConnectionPool(minconn=POOL_MIN_CONN, maxconn=POOL_MAX_CONN, dsn=dsn)
+    return _pool
+
+@contextmanager
+def get_db_connection():
+    """Borrow a pooled connection; it is rolled back on error and always returned."""
+    pool = _get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
@@ -1,31 +1,35 @@
 import os
+import re
+import json
+import asyncio
 import logging
+import httpx
 import openai
-from typing import Dict, Optional, Union
+from typing import Dict, List, Optional, Union
 from datetime import datetime
 
 from agent_types import MarketState, LiveMarketState, TradeDecision
 from volatility_tools import format_market_data
 
-class LLMTool:
-    def __init__(self):
-        self.api_key = os.getenv('OPENAI_API_KEY')
-        if not self.api_key:
-            raise ValueError("OpenAI API key not found")
-            
-        openai.api_key = self.api_key
-        
-    def run(self, prompt: str) -> Dict:
-        """Run LLM inference."""
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": """
+# Upper bound on in-flight requests per batch, to stay inside the OpenAI rate limit
+MAX_CONCURRENCY = 8
+
+# One keep-alive pool sized for a full batch, so concurrent calls don't queue on connections
+HTTP_LIMITS = httpx.Limits(
+    max_connections=MAX_CONCURRENCY * 2,
+    max_keepalive_connections=MAX_CONCURRENCY,
+    keepalive_expiry=30.0
+)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+# Outermost {...} block; the model sometimes wraps the JSON in prose or code fences
+_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+SYSTEM_PROMPT = """
                     You are a sophisticated sports trading assistant.
                     Your role is to analyze market data and volatility metrics
                     to make trading decisions.
-                    
+
                     Respond with a JSON object containing:
                     {
                         "analysis": "Your detailed analysis",
@@ -33,59 +37,131 @@ class LLMTool:
                         "recommendation": "BUY_VOL or SELL_VOL or NO_ACTION",
                         "size": 0-100 (% of capital to risk)
                     }
-                    """},
-                    {"role": "user", "content": prompt}
-                ],
+                    """
+
+class LLMTool:
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY):
+        self.api_key = os.getenv('OPENAI_API_KEY')
+        if not self.api_key:
+            raise ValueError("OpenAI API key not found")
+
+        self.client = openai.OpenAI(api_key=self.api_key)
+        self.max_concurrency = max_concurrency
+
+    def _messages(self, prompt: str) -> List[Dict]:
+        """Build the chat messages for a prompt."""
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _parse(self, content: str) -> Dict:
+        """Parse the model's JSON reply into a dict."""
+        match = _JSON_RE.search(content)
+        if not match:
+            raise ValueError("No JSON object in LLM response")
+        result = json.loads(match.group(0))
+
+        for key in ('confidence', 'size'):
+            if key in result:
+                try:
+                    result[key] = float(result[key])
+                except (TypeError, ValueError):
+                    result[key] = 0.0
+
+        return result
+
+    def _error_result(self, e: Exception) -> Dict:
+        logging.error(f"LLM error: {str(e)}")
+        return {
+            "analysis": "Error in LLM processing",
+            "confidence": 0.0,
+            "recommendation": "NO_ACTION",
+            "size": 0
+        }
+
+    def run(self, prompt: str) -> Dict:
+        """Run LLM inference."""
+        try:
+            response = self.client.chat.completions.create(
+                model="gpt-4",
+                messages=self._messages(prompt),
                 temperature=0.7
             )
-            
+
             # Extract decision from response
-            content = response.choices[0].message.content
-            
-            # Parse JSON-like string (basic implementation)
-            lines = content.strip().split('\n')
-            result = {}
-            
-            for line in lines:
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    key = key.strip().strip('"{}')
-                    value = value.strip().strip('",')
-                    if key == 'confidence' or key == 'size':
-                        try:
-                            value = float(value)
-                        except:
-                            value = 0.0
-                    result[key] = value
-            
-            return result
-            
+            return self._parse(response.choices[0].message.content)
+
         except Exception as e:
-            logging.error(f"LLM error: {str(e)}")
-            return {
-                "analysis": "Error in LLM processing",
-                "confidence": 0.0,
-                "recommendation": "NO_ACTION",
-                "size": 0
-            }
-    
-    def get_decision(self, state: Union[MarketState, LiveMarketState]) -> TradeDecision:
-        """Get trading decision for market state."""
-        # Format data
-        prompt = format_market_data(state)
-        
-        # Get LLM analysis
-        result = self.run(prompt)
-        
+            return self._error_result(e)
+
+    async def _run_async(self, client: openai.AsyncOpenAI, prompt: str,
+                         semaphore: asyncio.Semaphore) -> Dict:
+        """Run one LLM inference on the shared async client."""
+        try:
+            async with semaphore:
+                response = await client.chat.completions.create(
+                    model="gpt-4",
+                    messages=self._messages(prompt),
+                    temperature=0.7
+                )
+            return self._parse(response.choices[0].message.content)
+
+        except Exception as e:
+            return self._error_result(e)
+
+    async def run_batch(self, prompts: List[str]) -> List[Dict]:
+        """Run several prompts concurrently, returning results in prompt order."""
+        if not prompts:
+            return []
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        # The async client is bound to the running event loop, so it is opened per batch
+        http_client = httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        async with openai.AsyncOpenAI(api_key=self.api_key, http_client=http_client) as client:
+            return await asyncio.gather(
+                *(self._run_async(client, prompt, semaphore) for prompt in prompts)
+            )
+
+    def _to_decision(self, state: Union[MarketState, LiveMarketState], result: Dict,
+                     timestamp: Optional[str] = None) -> TradeDecision:
         return TradeDecision(
             event_id=state.event_id,
             league=state.league,
             side_index=state.side_index,
             analysis=result,
-            timestamp=datetime.utcnow().isoformat()
+            timestamp=timestamp or datetime.utcnow().isoformat()
         )
 
+    def get_decision(self, state: Union[MarketState, LiveMarketState]) -> TradeDecision:
+        """Get trading decision for market state."""
+        # Format data
+        prompt = format_market_data(state)
+
+        # Get LLM analysis
+        result = self.run(prompt)
+
+        return self._to_decision(state, result)
+
+    async def get_decisions_batch(self, states: List[Union[MarketState, LiveMarketState]]) -> List[TradeDecision]:
+        """Get trading decisions for several market states concurrently."""
+        prompts = [format_market_data(state) for state in states]
+        results = await self.run_batch(prompts)
+        # One timestamp for the whole batch; the decisions all answer the same tick
+        timestamp = datetime.utcnow().isoformat()
+        return [self._to_decision(state, result, timestamp) for state, result in zip(states, results)]
+
+    def get_decisions_batch_sync(self, states: List[Union[MarketState, LiveMarketState]]) -> List[TradeDecision]:
+        """Blocking wrapper around get_decisions_batch for non-async callers."""
+        return asyncio.run(self.get_decisions_batch(states))
+
 def get_llm_response(prompt: str) -> Dict:
     """Simple wrapper for one-off LLM calls."""
     tool = LLMTool()
-    return tool.run(prompt) 
\ No newline at end of file
+    return tool.run(prompt)
+
+def get_llm_responses(prompts: List[str], max_concurrency: int = MAX_CONCURRENCY) -> List[Dict]:
+    """Run several prompts concurrently, returning results in prompt order."""
+    if not prompts:
+        return []
+    tool = LLMTool(max_concurrency=max_concurrency)
+    return asyncio.run(tool.run_batch(prompts))
@@ -11,6 +11,8 @@ It defines two agents:
 
 Before running, ensure that your environment variables (including DATABASE_URL/POSTGRES_URL) are set.
 Also, ensure that the table billysbetdata exists and that the new table billysSellData is created.
+Run `python sell_signal_generator.py --migrate` once per database to add billysbetdata.pregame_iv,
+fill it for existing bets and install the trigger that sets it on new ones.
 To run, execute:
     python multi_agent_voltrade.py
 """
@@ -28,38 +30,28 @@ def run_pregame_bet_analysis():
         
         if not bets:
             logging.warning("No active positions found. Checking database status...")
-            conn = get_db_connection()
-            with conn.cursor() as cur:
-                # Check if table exists
-                cur.execute("""
-                    SELECT EXISTS (
-                        SELECT 1 
-                        FROM information_schema.tables 
-                        WHERE table_name = 'billysbetdata'
-                    )
-                """)
+            with get_db_connection() as conn, conn.cursor() as cur:
+                # Check if table exists (to_regclass gives NULL instead of raising)
+                cur.execute("SELECT to_regclass('billysbetdata') IS NOT NULL")
                 table_exists = cur.fetchone()[0]
                 
                 if not table_exists:
                     return "Error: Table 'billysbetdata' does not exist. Please create the table first."
                 
-                # Check if table has any data
-                cur.execute("SELECT COUNT(*) FROM billysbetdata")
-                count = cur.fetchone()[0]
-                
-                if count == 0:
-                    return "Error: No bets found in billysbetdata table. Please add some bets first."
-                
-                # If table exists and has data, show executed/redemption status
+                # Row count and executed/redemption status in one scan
                 cur.execute("""
                     SELECT 
                         COUNT(*) as total,
-                        SUM(CASE WHEN executed THEN 1 ELSE 0 END) as executed,
-                        SUM(CASE WHEN redemption_status THEN 1 ELSE 0 END) as redeemed,
-                        SUM(CASE WHEN executed AND NOT redemption_status THEN 1 ELSE 0 END) as active
+                        COUNT(*) FILTER (WHERE executed) as executed,
+                        COUNT(*) FILTER (WHERE redemption_status) as redeemed,
+                        COUNT(*) FILTER (WHERE executed AND NOT redemption_status) as active
                     FROM billysbetdata
                 """)
                 stats = cur.fetchone()
+                
+                if stats[0] == 0:
+                    return "Error: No bets found in billysbetdata table. Please add some bets first."
+                
                 return f"""
 Database Status:
 - Total bets: {stats[0]}
@@ -72,15 +64,15 @@ No active positions found to analyze. To analyze a position, it must be:
 2. Not yet redeemed (position still open)
 """
             
-        summary = "Active Positions:\n"
+        parts = ["Active Positions:\n"]
         for bet in bets:
             other_team = bet['away_team'] if bet['bet_team'] == bet['home_team'] else bet['home_team']
-            summary += (
+            parts.append(
                 f"Bet ID {bet['id']}, {bet['bet_team']} vs {other_team}\n"
                 f"Spread: {bet['spread']:+.1f}, ML: {bet['moneyline']:+d}, Total: {bet['total']} {bet['total_side']}\n"
                 f"Model Prob: {bet['pregame_moneyline_prob']:.3f}, Pregame IV: {bet['pregame_iv']:.4f}\n"
             )
-        return summary
+        return "".join(parts)
     except Exception as e:
         logging.error(f"Error in pregame bet analysis: {str(e)}")
         return f"Error running pregame analysis: {str(e)}"
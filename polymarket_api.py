@@ -1,13 +1,44 @@
+import copy
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
 import logging
+import math
 import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, Optional, List, Tuple, Any
-from team_mapping import get_team_abbr, generate_polymarket_slug, find_team_by_partial_name
+from scipy.special import ndtri
+from cache import ttl_cache
+from team_mapping import get_team_abbr, get_team_name, generate_polymarket_slug, find_team_by_partial_name
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# One pooled, retrying session for gamma-api and clob; the CLOB fetches run
+# on a thread pool, so the pool is sized above the default 10
+REQUEST_TIMEOUT = 5
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.25, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+# Description patterns, compiled once and shared by every market scanned
+# "Score: Home 85 - Away 82" or "Current score: 85-82", in one scan
+_SCORE_RE = re.compile(
+    r'Score:?\s*[A-Za-z\s]+\s*(?P<home_score>\d+)\s*-\s*[A-Za-z\s]+\s*(?P<away_score>\d+)'
+    r'|Current score:?\s*(?P<alt_home_score>\d+)\s*-\s*(?P<alt_away_score>\d+)'
+)
+_QUARTER_RE = re.compile(r'(?:Time|Quarter):\s*(?P<quarter>\d)(?:st|nd|rd|th)(?:\s*quarter)?,?\s*(?P<minutes>\d+):(?P<seconds>\d+)')
+_HALFTIME_RE = re.compile(r'half[ -]time', re.IGNORECASE)
+_END_REG_RE = re.compile(r'end of (regulation|4th quarter)', re.IGNORECASE)
+
+# Game clock, assuming a 48 minute NBA game
+TOTAL_GAME_MINUTES = 48.0
+MINUTES_PER_QUARTER = TOTAL_GAME_MINUTES / 4
+
 # Mapping from condition IDs to Polymarket slugs
 # This would be populated with your actual mappings
 CONDITION_ID_TO_SLUG = {
@@ -16,13 +47,50 @@ CONDITION_ID_TO_SLUG = {
     # Add more mappings as needed
 }
 
+# Seconds a fetched event/order book is reused before hitting the API again
+CACHE_TTL_SECONDS = 5
+CACHE_MAX_SIZE = 1024
+# Combined market snapshots and team searches change more slowly than a
+# single summary render or polling pass
+MARKET_DATA_TTL_SECONDS = 10
+SEARCH_TTL_SECONDS = 60
+
+def clear_polymarket_cache() -> None:
+    """Drop all cached Polymarket responses, forcing the next calls to refetch."""
+    _fetch_event_data.cache_clear()
+    _fetch_clob_data.cache_clear()
+    _get_polymarket_data.cache_clear()
+    search_nba_events.cache_clear()
+
+# The cached fetchers raise on request failure, so an error is never cached
+# and the next call retries; the public wrappers turn errors into empty values
+
+@ttl_cache(ttl=CACHE_TTL_SECONDS, maxsize=CACHE_MAX_SIZE)
+def _fetch_event_data(slug: str) -> List[Dict]:
+    event_url = f"https://gamma-api.polymarket.com/events?slug={slug}"
+    response = _session.get(event_url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+@ttl_cache(ttl=CACHE_TTL_SECONDS, maxsize=CACHE_MAX_SIZE)
+def _fetch_clob_data(token_id: str) -> Dict:
+    url = f"https://clob.polymarket.com/book?token_id={token_id}"
+    response = _session.get(url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+def _try_fetch_clob_data(token_id: str) -> Optional[Dict]:
+    """_fetch_clob_data, or None if the request fails."""
+    try:
+        return _fetch_clob_data(token_id)
+    except Exception as e:
+        logging.error(f"Error fetching CLOB data for token {token_id}: {e}")
+        return None
+
 def fetch_event_data(slug: str) -> List[Dict]:
     """Fetch event data from Polymarket API by slug."""
     try:
-        event_url = f"https://gamma-api.polymarket.com/events?slug={slug}"
-        response = requests.get(event_url)
-        response.raise_for_status()
-        return response.json()
+        return copy.deepcopy(_fetch_event_data(slug))
     except Exception as e:
         logging.error(f"Error fetching event data: {e}")
         return []
@@ -30,10 +98,7 @@ def fetch_event_data(slug: str) -> List[Dict]:
 def fetch_clob_data(token_id: str) -> Dict:
     """Fetch order book data from Polymarket CLOB API."""
     try:
-        url = f"https://clob.polymarket.com/book?token_id={token_id}"
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
+        return copy.deepcopy(_fetch_clob_data(token_id))
     except Exception as e:
         logging.error(f"Error fetching CLOB data: {e}")
         return {}
@@ -43,83 +108,88 @@ def extract_score_differential(description: str) -> Optional[int]:
     Extract score differential from market description.
     Returns positive value if home team is leading, negative if away team is leading.
     """
-    # Look for patterns like "Score: Home 85 - Away 82" or similar
-    score_pattern = r'Score:?\s*(?P<home_team>[A-Za-z\s]+)\s*(?P<home_score>\d+)\s*-\s*(?P<away_team>[A-Za-z\s]+)\s*(?P<away_score>\d+)'
-    match = re.search(score_pattern, description)
-    
-    if match:
-        home_score = int(match.group('home_score'))
-        away_score = int(match.group('away_score'))
-        return home_score - away_score
-    
-    # Try alternative pattern: "Current score: 85-82"
-    alt_pattern = r'Current score:?\s*(?P<home_score>\d+)\s*-\s*(?P<away_score>\d+)'
-    match = re.search(alt_pattern, description)
-    
-    if match:
-        home_score = int(match.group('home_score'))
-        away_score = int(match.group('away_score'))
-        return home_score - away_score
-    
-    return None
+    match = _SCORE_RE.search(description)
+    if not match:
+        return None
+
+    home_score = int(match.group('home_score') or match.group('alt_home_score'))
+    away_score = int(match.group('away_score') or match.group('alt_away_score'))
+    return home_score - away_score
 
 def extract_game_time(description: str) -> Optional[float]:
     """
     Extract normalized game time (0.0 to 1.0) from description.
     Returns None if time cannot be determined.
     """
+    # Cheap substring checks gate each regex; most descriptions match none
     # Look for patterns like "Time: 3rd quarter, 5:30 remaining"
-    quarter_pattern = r'(?:Time|Quarter):\s*(?P<quarter>\d)(?:st|nd|rd|th)(?:\s*quarter)?,?\s*(?P<minutes>\d+):(?P<seconds>\d+)'
-    match = re.search(quarter_pattern, description)
+    match = _QUARTER_RE.search(description) if ':' in description else None
     
     if match:
         quarter = int(match.group('quarter'))
         minutes = int(match.group('minutes'))
         seconds = int(match.group('seconds'))
         
-        # Calculate elapsed time (assuming 48 minute NBA game)
-        total_game_minutes = 48.0
-        minutes_per_quarter = total_game_minutes / 4
-        
-        elapsed_minutes = (quarter - 1) * minutes_per_quarter + (minutes_per_quarter - minutes - seconds/60)
-        return min(1.0, max(0.0, elapsed_minutes / total_game_minutes))
+        elapsed_minutes = (quarter - 1) * MINUTES_PER_QUARTER + (MINUTES_PER_QUARTER - minutes - seconds/60)
+        return min(1.0, max(0.0, elapsed_minutes / TOTAL_GAME_MINUTES))
+    
+    desc_lower = description.lower()
     
     # Look for halftime
-    if re.search(r'half[ -]time', description, re.IGNORECASE):
+    if 'half' in desc_lower and _HALFTIME_RE.search(desc_lower):
         return 0.5
     
     # Look for end of regulation
-    if re.search(r'end of (regulation|4th quarter)', description, re.IGNORECASE):
+    if 'end of' in desc_lower and _END_REG_RE.search(desc_lower):
         return 1.0
     
     return None
 
 def get_polymarket_data(slug: str) -> Optional[Dict]:
     """Get combined event and CLOB data for a specific market."""
-    event_data = fetch_event_data(slug)
-    if not event_data:
+    try:
+        market_data, _ = _get_polymarket_data(slug)
+    except Exception as e:
+        logging.error(f"Error fetching market data for {slug}: {e}")
         return None
+    # Callers update the result and its order books, so hand out a deep copy
+    return copy.deepcopy(market_data) if market_data else None
+
+# Snapshots missing an order book that failed to load are not cached
+@ttl_cache(ttl=MARKET_DATA_TTL_SECONDS, maxsize=CACHE_MAX_SIZE, cache_if=lambda result: result[1])
+def _get_polymarket_data(slug: str) -> Tuple[Optional[Dict], bool]:
+    """(market snapshot or None, whether every order book loaded)."""
+    # Event request errors propagate so a failed fetch isn't cached as "no market"
+    event_data = _fetch_event_data(slug)
+    if not event_data:
+        return None, True
         
     event = event_data[0]  # Assuming first event is what we want
     
     # Extract market data
     if not event.get('markets'):
-        return None
+        return None, True
         
     market = event['markets'][0]
     
     # Get token IDs for order book
     try:
-        clob_token_ids = json.loads(market.get('clobTokenIds', '[]'))
-    except json.JSONDecodeError:
+        clob_token_ids = orjson.loads(market.get('clobTokenIds', '[]'))
+    except orjson.JSONDecodeError:
         logging.error(f"Error parsing clobTokenIds for {slug}")
         clob_token_ids = []
     
+    # Fetch every token's order book in parallel; map() keeps token order.
+    # A failed book is skipped rather than dropping the whole market
     clob_results = []
-    for token_id in clob_token_ids:
-        clob_data = fetch_clob_data(token_id)
-        if clob_data:
-            clob_results.append(clob_data)
+    books_complete = True
+    if clob_token_ids:
+        with ThreadPoolExecutor(max_workers=len(clob_token_ids)) as executor:
+            for clob_data in executor.map(_try_fetch_clob_data, clob_token_ids):
+                if clob_data is None:
+                    books_complete = False
+                elif clob_data:
+                    clob_results.append(clob_data)
     
     # Extract team names from title
     title = event.get('title', '')
@@ -129,10 +199,10 @@ def get_polymarket_data(slug: str) -> Optional[Dict]:
     
     # Extract current prices from outcomePrices or from best bid/ask
     try:
-        outcome_prices = json.loads(market.get('outcomePrices', '[0.5, 0.5]'))
+        outcome_prices = orjson.loads(market.get('outcomePrices', '[0.5, 0.5]'))
         away_price = float(outcome_prices[0]) if len(outcome_prices) > 0 else 0.5
         home_price = float(outcome_prices[1]) if len(outcome_prices) > 1 else 0.5
-    except (json.JSONDecodeError, ValueError):
+    except (orjson.JSONDecodeError, ValueError):
         away_price = 0.5
         home_price = 0.5
     
@@ -166,7 +236,15 @@ def get_polymarket_data(slug: str) -> Optional[Dict]:
         "description": description,
         "current_time": current_time,
         "clob_data": clob_results
-    }
+    }, books_complete
+
+@ttl_cache(ttl=SEARCH_TTL_SECONDS, maxsize=CACHE_MAX_SIZE)
+def search_nba_events(team_abbr: str) -> List[Dict]:
+    """Search Polymarket for NBA events involving a team; raises on request failure."""
+    search_url = f"https://gamma-api.polymarket.com/events?tag=nba&search={team_abbr}"
+    response = _session.get(search_url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return orjson.loads(response.content)
 
 def get_polymarket_slug_for_condition(condition_id, team_name=None):
     """
@@ -193,10 +271,7 @@ def get_polymarket_slug_for_condition(condition_id, team_name=None):
             # Try to find games with this team
             try:
                 # Search for games with this team
-                search_url = f"https://gamma-api.polymarket.com/events?tag=nba&search={team_abbr}"
-                response = requests.get(search_url)
-                response.raise_for_status()
-                events = response.json()
+                events = search_nba_events(team_abbr)
                 
                 # Find a game today with this team
                 for event in events:
@@ -228,6 +303,8 @@ def get_live_market_data_from_polymarket(condition_id, team_name):
     Returns:
         Dictionary with market data or None if not found
     """
+    team_abbr = get_team_abbr(team_name)
+    
     # Get slug for this condition
     slug = get_polymarket_slug_for_condition(condition_id, team_name)
     
@@ -235,16 +312,12 @@ def get_live_market_data_from_polymarket(condition_id, team_name):
         logging.warning(f"No slug found for condition {condition_id}, team {team_name}")
         
         # Try to find a game with this team
-        team_abbr = get_team_abbr(team_name)
         if team_abbr:
             today = datetime.now().strftime("%Y-%m-%d")
-            search_url = f"https://gamma-api.polymarket.com/events?tag=nba&search={team_abbr}"
             
             try:
                 logging.info(f"Searching for games with team {team_name} ({team_abbr})")
-                response = requests.get(search_url)
-                response.raise_for_status()
-                events = response.json()
+                events = search_nba_events(team_abbr)
                 
                 if events:
                     # Use the first event found
@@ -267,7 +340,6 @@ def get_live_market_data_from_polymarket(condition_id, team_name):
         return None
     
     # Determine if team is home or away
-    team_abbr = get_team_abbr(team_name)
     home_abbr = get_team_abbr(market_data["home_team"])
     away_abbr = get_team_abbr(market_data["away_team"])
     
@@ -313,33 +385,29 @@ def calculate_live_iv(score_diff: int, pregame_spread: float,
     Calculate live implied volatility using the formula:
     σ_IV,t = |l + μ(1-t)| / (|Φ⁻¹(live_prob)| * sqrt(1-t))
     """
-    import math
-    from scipy.stats import norm
-    
     # Pregame spread (μ)
     mu = pregame_spread
     
     # Time remaining (1-t)
     t_remain = 1.0 - time_elapsed
     
-    # Calculate inverse normal CDF
-    try:
-        z = abs(norm.ppf(live_prob))
-    except:
+    # Cheap guards first so rejected ticks never reach ndtri; the inverse
+    # normal CDF is only finite on the open interval (0, 1)
+    if t_remain <= 0 or live_prob is None or not 0.0 < live_prob < 1.0:
         return 0
-    
+    z = math.fabs(ndtri(live_prob))
+
     # Calculate live IV
-    if z < 1e-6 or t_remain <= 0:
+    if z < 1e-6:
         return 0
         
-    return abs(score_diff + mu * t_remain) / (z * math.sqrt(t_remain))
+    return math.fabs(score_diff + mu * t_remain) / (z * math.sqrt(t_remain))
 
 def calculate_expected_iv(pregame_iv: float, time_elapsed: float) -> float:
     """
     Calculate expected IV based on pregame IV and time elapsed.
     Expected IV decreases as sqrt(1-t).
     """
-    import math
     t_remain = 1.0 - time_elapsed
     return pregame_iv * math.sqrt(t_remain)
 
@@ -1,8 +1,18 @@
-from typing import Dict, Optional, Tuple
-from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+from dataclasses import dataclass, field
 from datetime import datetime
 import logging
-from agent_types import LEAGUE_PARAMS
+import time
+import numpy as np
+from agent_types import LEAGUE_TUPLES, position_key
+
+# Exit thresholds
+REVERSION_THRESHOLD = 0.3  # exit once deviation shrinks below 30% of initial
+STOP_LOSS_THRESHOLD = 1.5  # exit once deviation expands beyond 150% of initial
+GAME_STATE_SCORE_CHANGE = 14  # Example threshold for large score change
+
+_INITIAL_CAPACITY = 64
+_NS_PER_MINUTE = 60_000_000_000
 
 @dataclass
 class Position:
@@ -19,12 +29,39 @@ class Position:
     entry_score_diff: float
     entry_prob: float
     max_hold_time: float  # minutes
+    # Monotonic clock at entry, for hold-time checks; entry_time is for display
+    entry_ns: int = field(default_factory=time.monotonic_ns)
 
 class PositionManager:
     """Manages active positions and exit conditions."""
     
     def __init__(self):
-        self.active_positions: Dict[Tuple[int, int], Position] = {}  # (event_id, side_index) -> Position
+        self.active_positions: Dict[int, Position] = {}  # position_key(event_id, side_index) -> Position
+        
+        # Fields the exit checks read, kept as parallel arrays (one row per
+        # open position) so every position can be checked in one pass
+        self._rows: Dict[int, int] = {}  # position_key -> row
+        self._free_rows: List[int] = []
+        self._n_rows = 0
+        self._initial_dev = np.zeros(_INITIAL_CAPACITY)
+        self._entry_score = np.zeros(_INITIAL_CAPACITY)
+        self._entry_ns = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self._max_hold_ns = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        
+    def _alloc_row(self) -> int:
+        """Reuse a freed row, or append one, doubling the arrays when full."""
+        if self._free_rows:
+            return self._free_rows.pop()
+        if self._n_rows == len(self._initial_dev):
+            capacity = 2 * len(self._initial_dev)
+            for name in ("_initial_dev", "_entry_score", "_entry_ns", "_max_hold_ns"):
+                old = getattr(self, name)
+                grown = np.zeros(capacity, dtype=old.dtype)
+                grown[:len(old)] = old
+                setattr(self, name, grown)
+        row = self._n_rows
+        self._n_rows += 1
+        return row
         
     def open_position(
         self,
@@ -40,7 +77,7 @@ class PositionManager:
     ) -> Position:
         """Open a new position and track it."""
         # Get league-specific max hold time
-        max_hold_time = LEAGUE_PARAMS[league]["max_hold_time"]
+        max_hold_time = LEAGUE_TUPLES[league].max_hold_time
         
         # Create position
         position = Position(
@@ -59,7 +96,16 @@ class PositionManager:
         )
         
         # Track position
-        self.active_positions[(event_id, side_index)] = position
+        key = position_key(event_id, side_index)
+        if key in self._rows:
+            self._free_rows.append(self._rows.pop(key))
+        self.active_positions[key] = position
+        row = self._alloc_row()
+        self._rows[key] = row
+        self._initial_dev[row] = position.initial_deviation
+        self._entry_score[row] = score_diff
+        self._entry_ns[row] = position.entry_ns
+        self._max_hold_ns[row] = int(max_hold_time * _NS_PER_MINUTE)
         
         logging.info(f"Opened {position_type} position for event {event_id} side {side_index}")
         return position
@@ -72,7 +118,8 @@ class PositionManager:
         current_expected_vol: float,
         time_elapsed: float,
         current_prob: float,
-        score_diff: float
+        score_diff: float,
+        now_ns: Optional[int] = None
     ) -> Tuple[bool, str]:
         """
         Check if position should be exited based on:
@@ -81,36 +128,68 @@ class PositionManager:
         3. Time-based exit
         4. Game state exit (large score differential)
         
+        now_ns is a time.monotonic_ns() reading; callers checking many
+        positions per tick should take it once and pass it in.
+        
         Returns (should_exit, reason)
         """
-        position = self.active_positions.get((event_id, side_index))
-        if not position:
-            return False, ""
-            
+        exits = self.check_all_exits(
+            [(event_id, side_index)],
+            [current_live_vol],
+            [current_expected_vol],
+            [score_diff],
+            now_ns
+        )
+        if exits:
+            return True, exits[0][1]
+        return False, ""
+    
+    def check_all_exits(
+        self,
+        keys: Sequence[Tuple[int, int]],
+        current_live_vol: Sequence[float],
+        current_expected_vol: Sequence[float],
+        score_diff: Sequence[float],
+        now_ns: Optional[int] = None
+    ) -> List[Tuple[Tuple[int, int], str]]:
+        """
+        Check exit conditions for many positions at once.
+        
+        keys are (event_id, side_index) pairs aligned with the value arrays;
+        keys without an open position are ignored. Conditions are checked in
+        the same order as check_exit_conditions and the first hit wins.
+        
+        Returns [(key, reason)] for positions that should be exited
+        """
+        rows_by_index = [self._rows.get(position_key(event_id, side_index)) for event_id, side_index in keys]
+        tracked = [(i, row) for i, row in enumerate(rows_by_index) if row is not None]
+        if not tracked:
+            return []
+        idx = np.fromiter((i for i, _ in tracked), dtype=np.intp, count=len(tracked))
+        rows = np.fromiter((row for _, row in tracked), dtype=np.intp, count=len(tracked))
+        
         # Current deviation from expected vol
-        current_deviation = abs(current_live_vol - current_expected_vol)
+        live = np.asarray(current_live_vol, dtype=np.float64)[idx]
+        expected = np.asarray(current_expected_vol, dtype=np.float64)[idx]
+        current_deviation = np.abs(live - expected)
+        initial_deviation = self._initial_dev[rows]
         
-        # 1. Mean reversion exit (vol difference shrinks below 30% of initial)
-        reversion_threshold = 0.3
-        if current_deviation < reversion_threshold * position.initial_deviation:
-            return True, "MEAN_REVERSION"
-            
-        # 2. Stop loss exit (vol difference expands beyond 150% of initial)
-        stop_loss_threshold = 1.5
-        if current_deviation > stop_loss_threshold * position.initial_deviation:
-            return True, "STOP_LOSS"
-            
-        # 3. Time-based exit
-        minutes_held = (datetime.utcnow() - position.entry_time).total_seconds() / 60.0
-        if minutes_held >= position.max_hold_time:
-            return True, "TIME_BASED"
-            
-        # 4. Game state exit (if score differential becomes too large)
-        score_change = abs(score_diff - position.entry_score_diff)
-        if score_change > 14:  # Example threshold for large score change
-            return True, "GAME_STATE"
-            
-        return False, ""
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        score_change = np.abs(np.asarray(score_diff, dtype=np.float64)[idx] - self._entry_score[rows])
+        
+        reasons = np.select(
+            [
+                current_deviation < REVERSION_THRESHOLD * initial_deviation,
+                current_deviation > STOP_LOSS_THRESHOLD * initial_deviation,
+                now_ns - self._entry_ns[rows] >= self._max_hold_ns[rows],
+                score_change > GAME_STATE_SCORE_CHANGE
+            ],
+            ["MEAN_REVERSION", "STOP_LOSS", "TIME_BASED", "GAME_STATE"],
+            default=""
+        )
+        
+        return [(keys[i], str(reason)) for i, reason in zip(idx, reasons) if reason]
     
     def close_position(
         self,
@@ -119,7 +198,11 @@ class PositionManager:
         exit_reason: str
     ) -> Optional[Position]:
         """Close a position and remove from tracking."""
-        position = self.active_positions.pop((event_id, side_index), None)
+        key = position_key(event_id, side_index)
+        position = self.active_positions.pop(key, None)
+        row = self._rows.pop(key, None)
+        if row is not None:
+            self._free_rows.append(row)
         if position:
             logging.info(f"Closed position for event {event_id} side {side_index}: {exit_reason}")
         return position
@@ -130,7 +213,7 @@ class PositionManager:
         side_index: int
     ) -> Optional[Position]:
         """Get active position if it exists."""
-        return self.active_positions.get((event_id, side_index))
+        return self.active_positions.get(position_key(event_id, side_index))
     
     def has_position(
         self,
@@ -138,4 +221,4 @@ class PositionManager:
         side_index: int
     ) -> bool:
         """Check if position exists."""
-        return (event_id, side_index) in self.active_positions 
\ No newline at end of file
+        return position_key(event_id, side_index) in self.active_positions 
\ No newline at end of file
@@ -1,24 +1,72 @@
 # File: pregame_bet_agent.py
 
 import os
-import psycopg2
+import math
+from psycopg2.extras import NamedTupleCursor
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from scipy.stats import norm
+from scipy.special import ndtri
 from dotenv import load_dotenv
+from db import get_db_connection
 import sys
 from unabated_api import get_live_market_data, get_live_market_data_by_team
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
 
 # Use DATABASE_URL or POSTGRES_URL from your .env file
 DATABASE_URL = os.getenv("DATABASE_URL") or os.getenv("POSTGRES_URL")
 if not DATABASE_URL:
     raise ValueError("Postgres connection string not found in environment variables. Please set DATABASE_URL or POSTGRES_URL in your .env file.")
 
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
+# Concurrent Unabated lookups when loading bets
+API_MAX_WORKERS = 16
+# Rows fetched per round-trip from the active-bets cursor
+ACTIVE_BETS_ITERSIZE = 500
+
+# Indexes for the active-position read (executed AND NOT redemption_status)
+# and the status breakdown in multi_agent_voltrade, as (name, definition)
+BET_INDEXES = (
+    ("idx_billysbetdata_active", """
+    ON billysbetdata (id)
+    WHERE executed AND NOT redemption_status
+    """),
+    ("idx_billysbetdata_status", """
+    ON billysbetdata (executed, redemption_status)
+    """),
+)
+
+def create_bet_indexes():
+    """
+    Create the billysbetdata indexes if they don't exist yet. Run with
+    --migrate. A CREATE INDEX CONCURRENTLY that failed part way leaves an
+    INVALID index that IF NOT EXISTS would skip, so those are rebuilt.
+    """
+    try:
+        with get_db_connection() as conn:
+            # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cur:
+                    for name, definition in BET_INDEXES:
+                        cur.execute(
+                            "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)",
+                            (name,)
+                        )
+                        row = cur.fetchone()
+                        if row is not None and row[0]:
+                            continue
+                        if row is not None:
+                            logger.warning("Rebuilding invalid index %s", name)
+                            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+                        cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+            finally:
+                conn.autocommit = False  # don't hand an autocommit connection back to the pool
+        logger.info("billysbetdata indexes ready")
+    except Exception as e:
+        logger.error("Error creating billysbetdata indexes: %s", e)
 
 def compute_pregame_iv(pregame_spread, sportstensor_prob):
     """
@@ -28,10 +76,28 @@ def compute_pregame_iv(pregame_spread, sportstensor_prob):
     """
     if sportstensor_prob <= 0 or sportstensor_prob >= 1:
         return None
-    z = abs(norm.ppf(float(sportstensor_prob)))
+    z = math.fabs(ndtri(float(sportstensor_prob)))
     if z < 1e-6:
         return None
-    return abs(float(pregame_spread)) / z
+    return math.fabs(pregame_spread) / z
+
+def _parse_moneyline(text):
+    """int(text), requiring an explicit + or - sign."""
+    if not text.startswith(('+', '-')):
+        raise ValueError(f"moneyline without a sign: {text!r}")
+    return int(text)
+
+def _read_numeric(prompt, cast, invalid_msg, valid=None, out_of_range_msg=None):
+    """Prompt until the input parses with cast (and passes valid, if given)."""
+    while True:
+        try:
+            value = cast(input(prompt).strip())
+        except ValueError:
+            print(invalid_msg)
+            continue
+        if valid is None or valid(value):
+            return value
+        print(out_of_range_msg)
 
 def prompt_for_game_info():
     """Prompt user for all necessary game information."""
@@ -43,35 +109,23 @@ def prompt_for_game_info():
     info['bet_team'] = input("Enter team you bet on: ").strip()
     
     # Get spread
-    while True:
-        try:
-            spread = float(input("Enter the spread (positive for underdog, negative for favorite): "))
-            info['spread'] = spread
-            break
-        except ValueError:
-            print("Please enter a valid number.")
+    info['spread'] = _read_numeric(
+        "Enter the spread (positive for underdog, negative for favorite): ",
+        float, "Please enter a valid number."
+    )
     
     # Get moneyline
-    while True:
-        try:
-            ml = input("Enter the moneyline (e.g. +150 or -110): ")
-            if ml.startswith('+') or ml.startswith('-'):
-                info['moneyline'] = int(ml)
-                break
-            print("Moneyline must start with + or -")
-        except ValueError:
-            print("Please enter a valid moneyline.")
+    info['moneyline'] = _read_numeric(
+        "Enter the moneyline (e.g. +150 or -110): ",
+        _parse_moneyline, "Moneyline must be + or - followed by a whole number."
+    )
     
     # Get total
-    while True:
-        try:
-            total = float(input("Enter the game total (over/under): "))
-            if total > 0:
-                info['total'] = total
-                break
-            print("Total must be positive.")
-        except ValueError:
-            print("Please enter a valid number.")
+    info['total'] = _read_numeric(
+        "Enter the game total (over/under): ",
+        float, "Please enter a valid number.",
+        lambda total: total > 0, "Total must be positive."
+    )
     
     # Get side of total (if applicable)
     info['total_side'] = input("Did you bet Over or Under? (O/U): ").upper()
@@ -82,65 +136,65 @@ def prompt_for_game_info():
 
 def prompt_for_prob():
     """Prompt user for probability value."""
-    while True:
+    return _read_numeric(
+        "Enter the probability (between 0 and 1): ",
+        float, "Please enter a valid number.",
+        lambda prob: 0 < prob < 1, "Probability must be between 0 and 1."
+    )
+
+def _canonical_event_id(condition_id):
+    """Return the event ID form most likely to match Unabated's numeric event IDs."""
+    cid = str(condition_id)
+    if cid.startswith('0x'):
         try:
-            prob = float(input("Enter the probability (between 0 and 1): "))
-            if 0 < prob < 1:
-                return prob
-            print("Probability must be between 0 and 1.")
+            return str(int(cid[2:], 16))
         except ValueError:
-            print("Please enter a valid number.")
+            pass
+    return cid
+
+def _event_id_variants(condition_id):
+    """Fallback event ID formats to try when the canonical form misses."""
+    if not isinstance(condition_id, str):
+        return []
+    variants = [condition_id]
+    if condition_id.startswith('0x'):
+        # Without the prefix, and the last 16 chars in case it's too long
+        clean_hex = condition_id[2:]
+        variants.append(clean_hex)
+        variants.append(clean_hex[-16:])
+    return variants
 
 def get_game_info_from_api(condition_id, outcome):
     """Try to get game information from Unabated API first."""
     try:
-        logging.info(f"Attempting to fetch game info from API for condition {condition_id}")
-        
-        # Try different event ID formats
-        event_ids = []
+        logger.info("Attempting to fetch game info from API for condition %s", condition_id)
         
-        # Original hex string
-        if isinstance(condition_id, str):
-            event_ids.append(condition_id)
-            
-            # Remove 0x prefix if present
-            if condition_id.startswith('0x'):
-                clean_hex = condition_id[2:]
-                event_ids.append(clean_hex)
-                
-                # Try converting to decimal
-                try:
-                    decimal_id = str(int(clean_hex, 16))
-                    event_ids.append(decimal_id)
-                except ValueError:
-                    pass
-                    
-                # Try last 16 chars of hex (in case it's too long)
-                event_ids.append(clean_hex[-16:])
-                
-        logging.info(f"Will try event IDs: {event_ids}")
+        # Most lookups hit on the canonical form, so the variants are only
+        # tried if it misses
+        event_ids = list(dict.fromkeys([_canonical_event_id(condition_id), *_event_id_variants(condition_id)]))
+        logger.info("Will try event IDs: %s", event_ids)
         
         # Try each event ID format
         for event_id in event_ids:
-            logging.info(f"Trying event_id: {event_id}")
+            logger.info("Trying event_id: %s", event_id)
             market_data = get_live_market_data(event_id)
             if market_data:
-                logging.info(f"Found market data with event_id: {event_id}")
+                logger.info("Found market data with event_id: %s", event_id)
                 return market_data
                 
         # If no match found by ID, try finding by team name
         if outcome and 'team' in outcome:
-            logging.info(f"Trying to find event by team name: {outcome['team']}")
+            logger.info("Trying to find event by team name: %s", outcome['team'])
             market_data = get_live_market_data_by_team(outcome['team'])
             if market_data:
-                logging.info(f"Found market data by team name")
+                logger.info("Found market data by team name")
                 return market_data
             
-        logging.warning(f"No market data found for any event ID format or team name")
+        logger.warning("No market data found for any event ID format or team name")
         return None
             
     except Exception as e:
-        logging.error(f"Error getting game info from API: {e}")
+        logger.error("Error getting game info from API: %s", e)
         return None
 
 def run_pregame_bet_agent(interactive=True):
@@ -149,166 +203,169 @@ def run_pregame_bet_agent(interactive=True):
     and returns a list of bet dictionaries.
     """
     bets = []
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            # First check if the table exists and has any data
-            cur.execute("""
-                SELECT EXISTS (
-                    SELECT 1 
-                    FROM information_schema.tables 
-                    WHERE table_name = 'billysbetdata'
-                )
-            """)
-            table_exists = cur.fetchone()[0]
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                # to_regclass gives NULL for a missing table instead of raising
+                cur.execute("SELECT to_regclass('billysbetdata') IS NOT NULL")
+                table_exists = cur.fetchone()[0]
             
-            if not table_exists:
-                logging.error("Table 'billysbetdata' does not exist!")
-                return []
+                if not table_exists:
+                    logger.error("Table 'billysbetdata' does not exist!")
+                    return []
 
-            # Check total number of bets
-            cur.execute("SELECT COUNT(*) FROM billysbetdata")
-            total_bets = cur.fetchone()[0]
-            logging.info(f"Total bets in database: {total_bets}")
-            
-            # Modified query to show all bets, with their status
-            query = """
-            SELECT id, condition_id, outcome, price, amount, num_shares, 
-                   sportstensor_prob, start_time, executed, redemption_status
-            FROM billysbetdata
-            """
-            cur.execute(query)
-            all_rows = cur.fetchall()
-            logging.info(f"Found {len(all_rows)} total bets")
-            
-            # Now get just the executed but unredeemed bets (active positions)
-            query = """
-            SELECT id, condition_id, outcome, price, amount, num_shares, 
-                   sportstensor_prob, start_time
-            FROM billysbetdata
-            WHERE executed = true
-              AND redemption_status = false
-            """
-            cur.execute(query)
-            rows = cur.fetchall()
-            logging.info(f"Found {len(rows)} active positions")
+            # Executed but unredeemed bets (active positions). Server-side cursor,
+            # so game info lookups start on the first rows while the rest stream in
+            rows = []
+            futures = {}
+            with ThreadPoolExecutor(max_workers=API_MAX_WORKERS) as executor:
+                with conn.cursor(name='active_bets_cur', cursor_factory=NamedTupleCursor) as cur:
+                    cur.itersize = ACTIVE_BETS_ITERSIZE
+                    cur.execute("""
+                    SELECT id, condition_id, outcome, price, amount, num_shares, 
+                           sportstensor_prob, start_time
+                    FROM billysbetdata
+                    WHERE executed = true
+                      AND redemption_status = false
+                    """)
+                    for row in cur:
+                        rows.append(row)
+                        futures[row.id] = executor.submit(get_game_info_from_api, row.condition_id, row.outcome)
+                logger.info("Found %s active positions", len(rows))
 
-            for row in rows:
-                (bet_id, condition_id, outcome, price, amount, num_shares, sportstensor_prob, start_time) = row
+                # Prompting below stays serial
+                game_infos = {}
+                for bet_id, future in futures.items():
+                    try:
+                        game_infos[bet_id] = future.result()
+                    except Exception as e:
+                        logger.error("Error getting game info for bet %s: %s", bet_id, e)
+                        game_infos[bet_id] = None
+
+                append_bet = bets.append
+                for row in rows:
+                    (bet_id, condition_id, outcome, price, amount, num_shares, sportstensor_prob, start_time) = row
                 
-                # Use price instead of model probability for actual position
-                entry_prob = float(price)  # Assuming price is in probability format (0-1)
-                logging.info(f"Using entry price {entry_prob:.3f} for bet {bet_id}")
+                    # Use price instead of model probability for actual position
+                    entry_prob = float(price)  # Assuming price is in probability format (0-1)
+                    logger.info("Using entry price %.3f for bet %s", entry_prob, bet_id)
                 
-                # Try to get game info from API first
-                game_info = get_game_info_from_api(condition_id, outcome)
+                    # Game info from the API, if it was found
+                    game_info = game_infos.get(bet_id)
                 
-                # If API data not available and in interactive mode, prompt for info
-                if game_info is None:
-                    if interactive:
-                        logging.info("API data not available, prompting for manual input")
-                        print(f"\nProcessing bet {bet_id} for {outcome}")
-                        game_info = prompt_for_game_info()
-                    else:
-                        # Non-interactive mode: use defaults
-                        logging.warning("API data not available and non-interactive mode, using defaults")
-                        game_info = {
-                            'spread': 11.5,
-                            'moneyline': None,
-                            'total': None,
-                            'home_team': 'HOME',
-                            'away_team': 'AWAY',
-                            'bet_team': outcome,
-                            'total_side': None
-                        }
+                    # If API data not available and in interactive mode, prompt for info
+                    if game_info is None:
+                        if interactive:
+                            logger.info("API data not available, prompting for manual input")
+                            print(f"\nProcessing bet {bet_id} for {outcome}")
+                            game_info = prompt_for_game_info()
+                        else:
+                            # Non-interactive mode: use defaults
+                            logger.warning("API data not available and non-interactive mode, using defaults")
+                            game_info = {
+                                'spread': 11.5,
+                                'moneyline': None,
+                                'total': None,
+                                'home_team': 'HOME',
+                                'away_team': 'AWAY',
+                                'bet_team': outcome,
+                                'total_side': None
+                            }
                 
-                # Use absolute value of spread for IV calculation
-                pregame_iv = compute_pregame_iv(abs(game_info['spread']), float(entry_prob))
+                    home_team = game_info['home_team']
+                    away_team = game_info['away_team']
+                    bet_team = game_info['bet_team']
+                    spread = game_info['spread']
+                    moneyline = game_info['moneyline']
+                    total = game_info['total']
+                    total_side = game_info['total_side']
+                    model_prob = float(sportstensor_prob)
                 
-                bet = {
-                    "id": bet_id,
-                    "condition_id": condition_id,
-                    "outcome": outcome,
-                    "price": float(price),
-                    "amount": float(amount),
-                    "num_shares": float(num_shares),
-                    "sportstensor_prob": float(sportstensor_prob),
-                    "start_time": start_time,
-                    "entry_price": entry_prob,
-                    "pregame_iv": pregame_iv,
-                    "model_prob": float(sportstensor_prob),
-                    # Add all game info
-                    "home_team": game_info['home_team'],
-                    "away_team": game_info['away_team'],
-                    "bet_team": game_info['bet_team'],
-                    "spread": game_info['spread'],
-                    "moneyline": game_info['moneyline'],
-                    "total": game_info['total'],
-                    "total_side": game_info['total_side']
-                }
-                bets.append(bet)
+                    # Use absolute value of spread for IV calculation
+                    pregame_iv = compute_pregame_iv(abs(spread), entry_prob)
                 
-                # Log the collected information
-                logging.info(f"Collected bet info for {bet_id}:")
-                logging.info(f"Teams: {game_info['away_team']} @ {game_info['home_team']}")
-                logging.info(f"Bet on: {game_info['bet_team']}")
-                logging.info(f"Spread: {game_info['spread']}")
-                logging.info(f"Moneyline: {game_info['moneyline']}")
-                logging.info(f"Total: {game_info['total']} ({game_info['total_side']})")
+                    append_bet({
+                        "id": bet_id,
+                        "condition_id": condition_id,
+                        "outcome": outcome,
+                        "price": entry_prob,
+                        "amount": float(amount),
+                        "num_shares": float(num_shares),
+                        "sportstensor_prob": model_prob,
+                        "start_time": start_time,
+                        "entry_price": entry_prob,
+                        "pregame_iv": pregame_iv,
+                        "model_prob": model_prob,
+                        # Add all game info
+                        "home_team": home_team,
+                        "away_team": away_team,
+                        "bet_team": bet_team,
+                        "spread": spread,
+                        "moneyline": moneyline,
+                        "total": total,
+                        "total_side": total_side
+                    })
                 
-        conn.commit()
-    except Exception as e:
-        logging.error(f"Error in pregame bet agent: {e}")
-        raise
-    finally:
-        conn.close()
+                    # Log the collected information
+                    if logger.isEnabledFor(logging.INFO):
+                        logger.info("Collected bet info for %s:", bet_id)
+                        logger.info("Teams: %s @ %s", away_team, home_team)
+                        logger.info("Bet on: %s", bet_team)
+                        logger.info("Spread: %s", spread)
+                        logger.info("Moneyline: %s", moneyline)
+                        logger.info("Total: %s (%s)", total, total_side)
+                
+            conn.commit()
+        except Exception as e:
+            logger.exception("Error in pregame bet agent: %s", e)
+            raise
     return bets
 
 def init_database():
     """Initialize database with required tables."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
     
-    try:
-        # Create game_odds table with proper structure
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS game_odds (
-                id SERIAL PRIMARY KEY,
-                event_id TEXT NOT NULL,
-                timestamp_utc TIMESTAMP WITH TIME ZONE NOT NULL,
-                bet_type INTEGER NOT NULL,  -- 1=moneyline, 2=spread, 3=total
-                side_index INTEGER NOT NULL,  -- 0=away/over, 1=home/under
-                sportsbook_id INTEGER NOT NULL,
-                points DECIMAL(5,1),  -- spread or total points
-                american_odds INTEGER NOT NULL,  -- American odds format
-                game_clock TEXT,
-                status_id INTEGER,  -- 1=pregame, 2=live, 3=final
-                UNIQUE(event_id, timestamp_utc, bet_type, side_index, sportsbook_id)
-            )
-        """)
+        try:
+            # Create game_odds table with proper structure
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS game_odds (
+                    id SERIAL PRIMARY KEY,
+                    event_id TEXT NOT NULL,
+                    timestamp_utc TIMESTAMP WITH TIME ZONE NOT NULL,
+                    bet_type INTEGER NOT NULL,  -- 1=moneyline, 2=spread, 3=total
+                    side_index INTEGER NOT NULL,  -- 0=away/over, 1=home/under
+                    sportsbook_id INTEGER NOT NULL,
+                    points DECIMAL(5,1),  -- spread or total points
+                    american_odds INTEGER NOT NULL,  -- American odds format
+                    game_clock TEXT,
+                    status_id INTEGER,  -- 1=pregame, 2=live, 3=final
+                    UNIQUE(event_id, timestamp_utc, bet_type, side_index, sportsbook_id)
+                )
+            """)
         
-        # Create teams reference table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS teams (
-                id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                league TEXT NOT NULL,
-                UNIQUE(name, league)
-            )
-        """)
+            # Create teams reference table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS teams (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    league TEXT NOT NULL,
+                    UNIQUE(name, league)
+                )
+            """)
         
-        conn.commit()
-        logging.info("Database schema initialized")
+            conn.commit()
+            logger.info("Database schema initialized")
         
-    except Exception as e:
-        logging.error(f"Error initializing database: {e}")
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+        except Exception as e:
+            logger.error("Error initializing database: %s", e)
+            conn.rollback()
+            raise
 
 if __name__ == "__main__":
     interactive = "--non-interactive" not in sys.argv
+    if "--migrate" in sys.argv:
+        create_bet_indexes()
     bets = run_pregame_bet_agent(interactive=interactive)
     for bet in bets:
         print("\nBet Information:")
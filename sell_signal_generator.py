@@ -1,44 +1,73 @@
 # File: sell_signal_generator.py
 
 import os
+import sys
 import math
-import psycopg2
+from psycopg2.extras import NamedTupleCursor, execute_values
 import logging
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from scipy.stats import norm
+from scipy.special import ndtri
 from dotenv import load_dotenv
+from db import get_db_connection
 from unabated_api import get_live_market_data  # Import live market data from unabated_api.py
 from polymarket_api import get_live_market_data_from_polymarket
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.getenv("DATABASE_URL") or os.getenv("POSTGRES_URL")
 if not DATABASE_URL:
     raise ValueError("Postgres connection string not found in environment variables. Please set DATABASE_URL or POSTGRES_URL in your .env file.")
 
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
+# Positions analyzed concurrently in generate_sell_signals
+ANALYSIS_MAX_WORKERS = 10
+# Rows pulled per round-trip from the active-positions cursor
+POSITION_FETCH_SIZE = 500
 
 def create_sell_table_if_not_exists():
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-            CREATE TABLE IF NOT EXISTS billysSellData (
-                id SERIAL PRIMARY KEY,
-                bet_id INTEGER REFERENCES billysbetdata(id),
-                sell_shares NUMERIC(12,6) NOT NULL,
-                sell_price DECIMAL(10,8) NOT NULL,
-                sell_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """)
-            conn.commit()
-    except Exception as e:
-        logging.error(f"Error creating sell table: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                CREATE TABLE IF NOT EXISTS billysSellData (
+                    id SERIAL PRIMARY KEY,
+                    bet_id INTEGER REFERENCES billysbetdata(id),
+                    sell_shares NUMERIC(12,6) NOT NULL,
+                    sell_price DECIMAL(10,8) NOT NULL,
+                    sell_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """)
+                conn.commit()
+        except Exception as e:
+            logger.error("Error creating sell table: %s", e)
+            conn.rollback()
+
+def _has_pregame_iv_column(conn):
+    """Whether billysbetdata has the pregame_iv column added by migrate_pregame_iv."""
+    with conn.cursor() as cur:
+        cur.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'billysbetdata' AND column_name = 'pregame_iv'
+        """)
+        return cur.fetchone() is not None
+
+def compute_pregame_iv_batch(pregame_spread, sportstensor_prob):
+    """
+    Vectorized compute_pregame_iv, for the pregame pass over a chunk of bets.
+    NaN where the scalar version returns None.
+    """
+    spread = np.asarray(pregame_spread, dtype=np.float64)
+    prob = np.asarray(sportstensor_prob, dtype=np.float64)
+    valid = (prob > 0) & (prob < 1)
+    # Invalid rows produce inf/nan here and are masked out below
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.abs(ndtri(prob))
+        valid &= z >= 1e-6
+        iv = np.abs(spread) / z
+    return np.where(valid, iv, np.nan)
 
 def compute_pregame_iv(pregame_spread, sportstensor_prob):
     """
@@ -46,10 +75,10 @@ def compute_pregame_iv(pregame_spread, sportstensor_prob):
     """
     if sportstensor_prob <= 0 or sportstensor_prob >= 1:
         return None
-    z = abs(norm.ppf(float(sportstensor_prob)))
+    z = math.fabs(ndtri(float(sportstensor_prob)))
     if z < 1e-6:
         return None
-    return abs(float(pregame_spread)) / z
+    return math.fabs(pregame_spread) / z
 
 def compute_live_iv(l, mu, t, live_prob):
     """
@@ -59,148 +88,317 @@ def compute_live_iv(l, mu, t, live_prob):
     if t >= 1 or live_prob <= 0 or live_prob >= 1:
         return None
     remain = 1.0 - t
-    z = abs(norm.ppf(float(live_prob)))
-    if z < 1e-6 or remain <= 0:
+    z = math.fabs(ndtri(float(live_prob)))
+    if z < 1e-6:
+        return None
+    return math.fabs(l + mu * remain) / (z * math.sqrt(remain))
+
+def _store_pregame_ivs(conn, rows):
+    """Save computed pregame IVs as (pregame_iv, bet_id) rows."""
+    try:
+        with conn.cursor() as cur:
+            execute_values(cur, """
+            UPDATE billysbetdata AS b SET pregame_iv = v.pregame_iv
+            FROM (VALUES %s) AS v (pregame_iv, id)
+            WHERE b.id = v.id
+            """, rows, page_size=500)
+        conn.commit()
+        logger.info("Stored pregame IV for %s bets", len(rows))
+    except Exception as e:
+        # Not fatal; they are recomputed next run
+        logger.error("Error storing pregame IVs: %s", e)
+        conn.rollback()
+
+# Sets pregame_iv on every bet inserted (or re-priced) after the migration.
+# Postgres has no inverse normal CDF, so |Φ⁻¹(p)| uses Acklam's rational
+# approximation (relative error ~1e-9 against ndtri)
+PREGAME_IV_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION billysbetdata_abs_ndtri(p DOUBLE PRECISION)
+RETURNS DOUBLE PRECISION LANGUAGE plpgsql IMMUTABLE STRICT AS $$
+DECLARE
+    q DOUBLE PRECISION := least(p, 1 - p);
+    r DOUBLE PRECISION;
+BEGIN
+    IF q < 0.02425 THEN
+        r := sqrt(-2 * ln(q));
+        RETURN abs((((((-7.784894002430293e-03 * r - 3.223964580411365e-01) * r
+                      - 2.400758276161838e+00) * r - 2.549732539343734e+00) * r
+                      + 4.374664141464968e+00) * r + 2.938163982698783e+00)
+                   / ((((7.784695709041462e-03 * r + 3.224671290700398e-01) * r
+                      + 2.445134137142996e+00) * r + 3.754408661907416e+00) * r + 1));
+    END IF;
+    q := q - 0.5;
+    r := q * q;
+    RETURN abs((((((-3.969683028665376e+01 * r + 2.209460984245205e+02) * r
+                  - 2.759285104469687e+02) * r + 1.383577518672690e+02) * r
+                  - 3.066479806614716e+01) * r + 2.506628277459239e+00) * q
+               / (((((-5.447609879822406e+01 * r + 1.615858368580409e+02) * r
+                  - 1.556989798598866e+02) * r + 6.680131188771972e+01) * r
+                  - 1.328068155288572e+01) * r + 1));
+END
+$$;
+
+CREATE OR REPLACE FUNCTION billysbetdata_set_pregame_iv()
+RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    z DOUBLE PRECISION;
+BEGIN
+    NEW.pregame_iv := NULL;
+    IF NEW.pregame_spread IS NOT NULL AND NEW.sportstensor_prob > 0 AND NEW.sportstensor_prob < 1 THEN
+        z := billysbetdata_abs_ndtri(NEW.sportstensor_prob::DOUBLE PRECISION);
+        IF z >= 1e-6 THEN
+            NEW.pregame_iv := abs(NEW.pregame_spread::DOUBLE PRECISION) / z;
+        END IF;
+    END IF;
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS billysbetdata_pregame_iv ON billysbetdata;
+CREATE TRIGGER billysbetdata_pregame_iv
+BEFORE INSERT OR UPDATE OF pregame_spread, sportstensor_prob ON billysbetdata
+FOR EACH ROW EXECUTE FUNCTION billysbetdata_set_pregame_iv();
+"""
+
+def migrate_pregame_iv():
+    """
+    Add billysbetdata.pregame_iv, a trigger that sets it on new bets, and
+    fill it for existing bets that don't have one. Spread and probability
+    are fixed once a bet is placed, so its pregame IV is stored rather than
+    recomputed every run. Run once per database from the command line with
+    --migrate; generate_sell_signals never writes to billysbetdata.
+    """
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("ALTER TABLE billysbetdata ADD COLUMN IF NOT EXISTS pregame_iv DOUBLE PRECISION")
+                cur.execute(PREGAME_IV_TRIGGER_SQL)
+                cur.execute("""
+                SELECT id, pregame_spread, sportstensor_prob
+                FROM billysbetdata
+                WHERE pregame_iv IS NULL
+                """)
+                rows = cur.fetchall()
+            conn.commit()
+        except Exception as e:
+            logger.error("Error adding pregame_iv column and trigger: %s", e)
+            conn.rollback()
+            return
+        
+        if not rows:
+            return
+        ivs = compute_pregame_iv_batch(
+            [row[1] for row in rows],
+            [row[2] for row in rows]
+        )
+        backfill = [(float(iv), row[0]) for row, iv in zip(rows, ivs) if not np.isnan(iv)]
+        if backfill:
+            _store_pregame_ivs(conn, backfill)
+
+def _analyze_position(position, pregame_iv, use_polymarket):
+    """Fetch live market data for one position and return its sell signal, if any."""
+    (bet_id, condition_id, outcome, entry_price, amount, 
+     num_shares, sportstensor_prob, pregame_spread, _) = position
+    
+    logger.info("\nAnalyzing bet %s for %s", bet_id, outcome)
+    
+    if np.isnan(pregame_iv) or not pregame_iv:
+        logger.warning("Could not compute pregame IV for bet %s", bet_id)
+        return None
+        
+    pregame_iv = float(pregame_iv)
+    logger.info("Pregame IV: %.2f", pregame_iv)
+    
+    # Fetch market data
+    try:
+        logger.info("Fetching market data for condition %s...", condition_id)
+    
+        if use_polymarket:
+            # Use Polymarket API with team name
+            market_data = get_live_market_data_from_polymarket(str(condition_id), outcome)
+        else:
+            # Use Unabated API with team name
+            market_data = get_live_market_data(str(condition_id), outcome)
+    
+        if not market_data:
+            logger.warning("No market data available for bet %s", bet_id)
+            return None
+        
+        # If using Polymarket, calculate live IV and expected IV
+        if use_polymarket and market_data:
+            score_diff = market_data.get('score_diff', 0)
+            game_time = market_data.get('game_time', 0)
+            current_price = market_data.get('current_price')
+        
+            # Calculate live IV
+            live_vol = compute_live_iv(score_diff, float(pregame_spread), game_time, current_price)
+        
+            # Calculate expected IV
+            expected_vol = pregame_iv * math.sqrt(1 - game_time)
+        
+            # Update market data
+            market_data['live_vol'] = live_vol
+            market_data['expected_vol'] = expected_vol
+        
+        current_price = market_data.get('current_price')
+        if current_price is None:
+            logger.warning("No current price for bet %s", bet_id)
+            return None
+        logger.info("Current market price: %.3f", current_price)
+    
+        # Calculate PnL
+        pnl = (current_price - entry_price) * num_shares
+        pnl_percentage = (current_price - entry_price) / entry_price * 100
+        logger.info("Current PnL: $%.2f (%+.1f%%)", pnl, pnl_percentage)
+    
+        # Get volatility metrics
+        live_vol = market_data.get('live_vol')
+        expected_vol = market_data.get('expected_vol')
+        if live_vol is None or expected_vol is None:
+            # The Unabated feed carries no vols, and live IV is None past full time
+            logger.info("Live vol: %s, Expected vol: %s - skipping", live_vol, expected_vol)
+            return None
+        logger.info("Live vol: %.2f, Expected vol: %.2f", live_vol, expected_vol)
+    
+        # Check if position is in profit
+        if pnl <= 0:
+            logger.info("Position not in profit - skipping")
+            return None
+        
+        # Check volatility conditions
+        vol_diff = live_vol - expected_vol
+        vol_ratio = live_vol / expected_vol if expected_vol else float('inf')
+        logger.info("Vol difference: %.2f, Vol ratio: %.2f", vol_diff, vol_ratio)
+    
+        # Calculate sell fraction based on the formula
+        sell_fraction = min(1.0, (pregame_iv - live_vol) / pregame_iv)
+    
+        # Calculate shares to sell
+        suggested_shares = num_shares * sell_fraction
+    
+        # Cap shares to sell based on initial wager
+        max_shares_to_recover_initial = amount / current_price
+        suggested_shares = min(suggested_shares, max_shares_to_recover_initial)
+    
+        if vol_ratio > 1.3:  # Example threshold
+            logger.info("Volatility conditions met for sell signal")
+            return {
+                "id": bet_id,
+                "condition_id": condition_id,
+                "outcome": outcome,
+                "entry_price": entry_price,
+                "current_price": current_price,
+                "pnl": pnl,
+                "pnl_percentage": pnl_percentage,
+                "live_vol": live_vol,
+                "expected_vol": expected_vol,
+                "suggested_sell_shares": suggested_shares,
+                "suggested_sell_price": current_price
+            }
+        logger.info("Volatility conditions not met for sell signal")
+        return None
+    except Exception as e:
+        logger.error("Error analyzing bet %s: %s", bet_id, e)
         return None
-    return abs(l + mu * remain) / (z * math.sqrt(remain))
 
 def generate_sell_signals(use_polymarket=False):
-    """Generate sell signals for active positions."""
-    signals = []
-    conn = get_db_connection()
+    """
+    Generate sell signals for active positions.
     
+    Stored pregame IVs are used where billysbetdata.pregame_iv exists and is
+    set; the rest are computed in memory. Nothing is written back.
+    """
     try:
-        with conn.cursor() as cur:
-            # Get active positions
-            cur.execute("""
-            SELECT id, condition_id, outcome, price, amount, num_shares, 
-                   sportstensor_prob, pregame_spread
-            FROM billysbetdata
-            WHERE executed = true
-              AND redemption_status = false
-            """)
-            active_positions = cur.fetchall()
+        # Market data fetches are network-bound, so overlap them across positions
+        with ThreadPoolExecutor(max_workers=ANALYSIS_MAX_WORKERS) as executor:
+            active_positions = []
+            futures = []
+            with get_db_connection() as conn:
+                if _has_pregame_iv_column(conn):
+                    pregame_iv_col = "pregame_iv"
+                else:
+                    pregame_iv_col = "NULL::double precision AS pregame_iv"
+                # Server-side cursor: positions are handed to the workers a chunk
+                # at a time while the rest are still being read
+                with conn.cursor(name='active_positions_cur', cursor_factory=NamedTupleCursor) as cur:
+                    cur.execute(f"""
+                    SELECT id, condition_id, outcome, price, amount, num_shares, 
+                           sportstensor_prob, pregame_spread, {pregame_iv_col}
+                    FROM billysbetdata
+                    WHERE executed = true
+                      AND redemption_status = false
+                    """)
+                    while True:
+                        chunk = cur.fetchmany(POSITION_FETCH_SIZE)
+                        if not chunk:
+                            break
+                        
+                        pregame_ivs = np.array(
+                            [np.nan if position.pregame_iv is None else position.pregame_iv for position in chunk],
+                            dtype=np.float64
+                        )
+                        
+                        # Compute the ones not stored yet in one pass
+                        missing = np.isnan(pregame_ivs)
+                        if missing.any():
+                            pending = [position for position, m in zip(chunk, missing) if m]
+                            pregame_ivs[missing] = compute_pregame_iv_batch(
+                                [position.pregame_spread for position in pending],
+                                [position.sportstensor_prob for position in pending]
+                            )
+                        for position, pregame_iv in zip(chunk, pregame_ivs):
+                            active_positions.append(position)
+                            futures.append(executor.submit(_analyze_position, position, pregame_iv, use_polymarket))
             
             if not active_positions:
-                logging.info("No active positions found")
+                logger.info("No active positions found")
                 return []
-                
-            logging.info(f"Found {len(active_positions)} active positions")
             
-            for position in active_positions:
+            logger.info("Found %s active positions", len(active_positions))
+            
+            signals = []
+            for position, future in zip(active_positions, futures):
                 try:
-                    (bet_id, condition_id, outcome, entry_price, amount, 
-                     num_shares, sportstensor_prob, pregame_spread) = position
-                    
-                    logging.info(f"\nAnalyzing bet {bet_id} for {outcome}")
-                    
-                    # Calculate pregame IV
-                    pregame_iv = compute_pregame_iv(pregame_spread, sportstensor_prob)
-                    if not pregame_iv:
-                        logging.warning(f"Could not compute pregame IV for bet {bet_id}")
-                        continue
-                        
-                    logging.info(f"Pregame IV: {pregame_iv:.2f}")
-                    
-                    # Fetch market data
-                    try:
-                        logging.info(f"Fetching market data for condition {condition_id}...")
-                        
-                        if use_polymarket:
-                            # Use Polymarket API with team name
-                            market_data = get_live_market_data_from_polymarket(str(condition_id), outcome)
-                        else:
-                            # Use Unabated API with team name
-                            market_data = get_live_market_data(str(condition_id), outcome)
-                        
-                        if not market_data:
-                            logging.warning(f"No market data available for bet {bet_id}")
-                            continue
-                            
-                        # If using Polymarket, calculate live IV and expected IV
-                        if use_polymarket and market_data:
-                            score_diff = market_data.get('score_diff', 0)
-                            game_time = market_data.get('game_time', 0)
-                            current_price = market_data.get('current_price')
-                            
-                            # Calculate live IV
-                            live_vol = compute_live_iv(score_diff, float(pregame_spread), game_time, current_price)
-                            
-                            # Calculate expected IV
-                            expected_vol = pregame_iv * math.sqrt(1 - game_time)
-                            
-                            # Update market data
-                            market_data['live_vol'] = live_vol
-                            market_data['expected_vol'] = expected_vol
-                            
-                        current_price = market_data.get('current_price')
-                        logging.info(f"Current market price: {current_price:.3f}")
-                        
-                        # Calculate PnL
-                        pnl = (current_price - entry_price) * num_shares
-                        pnl_percentage = (current_price - entry_price) / entry_price * 100
-                        logging.info(f"Current PnL: ${pnl:.2f} ({pnl_percentage:+.1f}%)")
-                        
-                        # Get volatility metrics
-                        live_vol = market_data.get('live_vol')
-                        expected_vol = market_data.get('expected_vol')
-                        logging.info(f"Live vol: {live_vol:.2f}, Expected vol: {expected_vol:.2f}")
-                        
-                        # Check if position is in profit
-                        if pnl <= 0:
-                            logging.info("Position not in profit - skipping")
-                            continue
-                            
-                        # Check volatility conditions
-                        vol_diff = live_vol - expected_vol
-                        vol_ratio = live_vol / expected_vol if expected_vol else float('inf')
-                        logging.info(f"Vol difference: {vol_diff:.2f}, Vol ratio: {vol_ratio:.2f}")
-                        
-                        # Calculate sell fraction based on the formula
-                        sell_fraction = min(1.0, (pregame_iv - live_vol) / pregame_iv)
-                        
-                        # Calculate shares to sell
-                        suggested_shares = num_shares * sell_fraction
-                        
-                        # Cap shares to sell based on initial wager
-                        max_shares_to_recover_initial = amount / current_price
-                        suggested_shares = min(suggested_shares, max_shares_to_recover_initial)
-                        
-                        if vol_ratio > 1.3:  # Example threshold
-                            logging.info("Volatility conditions met for sell signal")
-                            signals.append({
-                                "id": bet_id,
-                                "condition_id": condition_id,
-                                "outcome": outcome,
-                                "entry_price": entry_price,
-                                "current_price": current_price,
-                                "pnl": pnl,
-                                "pnl_percentage": pnl_percentage,
-                                "live_vol": live_vol,
-                                "expected_vol": expected_vol,
-                                "suggested_sell_shares": suggested_shares,
-                                "suggested_sell_price": current_price
-                            })
-                        else:
-                            logging.info("Volatility conditions not met for sell signal")
-                    except Exception as e:
-                        logging.error(f"Error analyzing bet {bet_id}: {str(e)}")
-                        continue
+                    signal = future.result()
                 except Exception as e:
-                    logging.error(f"Error processing position {position}: {str(e)}")
+                    logger.error("Error processing position %s: %s", position, e)
                     continue
-                    
-            logging.info(f"\nGenerated {len(signals)} sell signals")
-            return signals
+                if signal:
+                    signals.append(signal)
+            
+        logger.info("\nGenerated %s sell signals", len(signals))
+        return signals
     except Exception as e:
-        logging.error(f"Error in sell signal generation: {str(e)}")
+        logger.exception("Error in sell signal generation: %s", e)
         return []
-    finally:
-        conn.close()
+
+def write_sell_signals(signals):
+    """Record suggested sells in billysSellData with a single batched INSERT."""
+    if not signals:
+        return 0
+    rows = [
+        (s['id'], s['suggested_sell_shares'], s['suggested_sell_price'])
+        for s in signals
+    ]
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            execute_values(
+                cur,
+                "INSERT INTO billysSellData (bet_id, sell_shares, sell_price) VALUES %s",
+                rows,
+                page_size=500
+            )
+        conn.commit()
+    logger.info("Recorded %s sell signals", len(rows))
+    return len(rows)
 
 if __name__ == "__main__":
     create_sell_table_if_not_exists()
+    if "--migrate" in sys.argv:
+        migrate_pregame_iv()
     signals = generate_sell_signals()
+    if "--write" in sys.argv:
+        write_sell_signals(signals)
     for s in signals:
         print(s)
 
@@ -2,8 +2,12 @@
 Team mapping utilities for sports betting APIs
 """
 
-# NBA team mapping for Unabated API
-NBA_TEAM_IDS = {
+from functools import lru_cache
+from types import MappingProxyType
+
+# NBA team mapping for Unabated API. The tables are read-only so the
+# memoized lookups below can never go stale.
+NBA_TEAM_IDS = MappingProxyType({
     63: "ATL",  # Atlanta Hawks
     64: "BOS",  # Boston Celtics
     65: "BKN",  # Brooklyn Nets
@@ -34,10 +38,10 @@ NBA_TEAM_IDS = {
     90: "TOR",  # Toronto Raptors
     91: "UTA",  # Utah Jazz
     92: "WAS",  # Washington Wizards
-}
+})
 
 # Full team names to abbreviations
-NBA_TEAM_ABBR = {
+NBA_TEAM_ABBR = MappingProxyType({
     "Atlanta Hawks": "ATL",
     "Boston Celtics": "BOS",
     "Brooklyn Nets": "BKN",
@@ -69,12 +73,18 @@ NBA_TEAM_ABBR = {
     "Toronto Raptors": "TOR",
     "Utah Jazz": "UTA",
     "Washington Wizards": "WAS"
-}
+})
 
 # Abbreviations to full team names
-NBA_ABBR_TO_TEAM = {v: k for k, v in NBA_TEAM_ABBR.items()}
+NBA_ABBR_TO_TEAM = MappingProxyType({v: k for k, v in NBA_TEAM_ABBR.items()})
+
+# Lowercased names, built once so lookups don't re-lower every entry per call.
+# Kept in NBA_TEAM_ABBR order so partial matches resolve to the same team as before.
+_LOWER_NAMES = tuple((name.casefold(), name, abbr) for name, abbr in NBA_TEAM_ABBR.items())
+_LOWER_TO_NAME = {lower: name for lower, name, _ in reversed(_LOWER_NAMES)}
 
 # Polymarket slug format: nba-{away_abbr}-{home_abbr}-YYYY-MM-DD
+@lru_cache(maxsize=1024)
 def generate_polymarket_slug(away_team, home_team, game_date):
     """
     Generate a Polymarket slug from team names and date
@@ -95,6 +105,7 @@ def generate_polymarket_slug(away_team, home_team, game_date):
         
     return f"nba-{away_abbr.lower()}-{home_abbr.lower()}-{game_date}"
 
+@lru_cache(maxsize=1024)
 def get_team_abbr(team_name):
     """
     Get team abbreviation from team name
@@ -113,13 +124,18 @@ def get_team_abbr(team_name):
     if team_name in NBA_ABBR_TO_TEAM:
         return team_name
         
-    # Partial match
-    for full_name, abbr in NBA_TEAM_ABBR.items():
-        if team_name.lower() in full_name.lower():
+    # Case-insensitive exact match, then partial match
+    needle = team_name.casefold()
+    exact = _LOWER_TO_NAME.get(needle)
+    if exact:
+        return NBA_TEAM_ABBR[exact]
+    for lower_name, _, abbr in _LOWER_NAMES:
+        if needle in lower_name:
             return abbr
             
     return None
 
+@lru_cache(maxsize=1024)
 def get_team_name(team_abbr):
     """
     Get full team name from abbreviation
@@ -140,6 +156,7 @@ def get_team_name(team_abbr):
             
     return None
 
+@lru_cache(maxsize=1024)
 def find_team_by_partial_name(partial_name):
     """
     Find team by partial name match
@@ -150,10 +167,13 @@ def find_team_by_partial_name(partial_name):
     Returns:
         Full team name or None if not found
     """
-    partial_name = partial_name.lower()
+    partial_name = partial_name.casefold()
     
-    for full_name in NBA_TEAM_ABBR.keys():
-        if partial_name in full_name.lower():
+    exact = _LOWER_TO_NAME.get(partial_name)
+    if exact:
+        return exact
+    for lower_name, full_name, _ in _LOWER_NAMES:
+        if partial_name in lower_name:
             return full_name
             
     return None 
\ No newline at end of file
@@ -0,0 +1,125 @@
+import threading
+import time
+from cache import ttl_cache
+
+def test_concurrent_misses_share_one_call():
+    calls = []
+    release = threading.Event()
+
+    @ttl_cache(ttl=60)
+    def slow(key):
+        calls.append(key)
+        release.wait(5)
+        return {"key": key}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(slow("a"))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    # Let every thread reach the cache before the first call returns
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join(5)
+
+    assert calls == ["a"]
+    assert len(results) == 8
+    assert all(r is results[0] for r in results)
+
+def test_exception_is_not_cached():
+    calls = []
+
+    @ttl_cache(ttl=60)
+    def flaky(key):
+        calls.append(key)
+        if len(calls) == 1:
+            raise ConnectionError("transient")
+        return key
+
+    try:
+        flaky("a")
+        assert False, "first call should raise"
+    except ConnectionError:
+        pass
+    assert flaky("a") == "a"
+    assert flaky("a") == "a"
+    assert len(calls) == 2
+
+def test_empty_result_is_cached():
+    calls = []
+
+    @ttl_cache(ttl=60)
+    def empty(key):
+        calls.append(key)
+        return []
+
+    assert empty("a") == []
+    assert empty("a") == []
+    assert len(calls) == 1
+
+def test_cache_if_false_is_not_kept():
+    calls = []
+
+    @ttl_cache(ttl=60, cache_if=lambda result: result[1])
+    def partial(key):
+        calls.append(key)
+        return key, len(calls) > 1
+
+    partial("a")
+    partial("a")
+    partial("a")
+    assert len(calls) == 2
+
+def test_entries_expire_after_ttl():
+    calls = []
+
+    @ttl_cache(ttl=0.05)
+    def f(key):
+        calls.append(key)
+        return key
+
+    f("a")
+    f("a")
+    time.sleep(0.1)
+    f("a")
+    assert len(calls) == 2
+
+def test_maxsize_evicts_oldest():
+    calls = []
+
+    @ttl_cache(ttl=60, maxsize=2)
+    def f(key):
+        calls.append(key)
+        return key
+
+    f("a")
+    f("b")
+    f("c")  # full: "a" is the oldest insert and goes
+    f("b")
+    f("c")
+    assert calls == ["a", "b", "c"]
+    f("a")
+    assert calls == ["a", "b", "c", "a"]
+
+def test_cache_clear():
+    calls = []
+
+    @ttl_cache(ttl=60)
+    def f(key):
+        calls.append(key)
+        return key
+
+    f("a")
+    f.cache_clear()
+    f("a")
+    assert len(calls) == 2
+
+if __name__ == "__main__":
+    test_concurrent_misses_share_one_call()
+    test_exception_is_not_cached()
+    test_empty_result_is_cached()
+    test_cache_if_false_is_not_kept()
+    test_entries_expire_after_ttl()
+    test_maxsize_evicts_oldest()
+    test_cache_clear()
+    print("All cache tests passed")
@@ -1,5 +1,4 @@
 import sqlite3
-import pandas as pd
 
 def check_database():
     # Connect to database
@@ -14,18 +13,23 @@ def check_database():
     # For each table, show row count and sample data
     for table in tables:
         table_name = table[0]
-        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+        # Names come from sqlite_master, quoted since they can't be bound as parameters
+        quoted = '"' + table_name.replace('"', '""') + '"'
+        cursor.execute(f"SELECT COUNT(*) FROM {quoted}")
         count = cursor.fetchone()[0]
         print(f"\nTable: {table_name}")
         print(f"Row count: {count}")
         
         if count > 0:
             # Show sample data
-            df = pd.read_sql(f"SELECT * FROM {table_name} LIMIT 5", conn)
+            cursor.execute(f"SELECT * FROM {quoted} LIMIT 5")
+            rows = cursor.fetchall()
             print("\nSample data:")
-            print(df)
+            print([d[0] for d in cursor.description])
+            for row in rows:
+                print(row)
     
     conn.close()
 
 if __name__ == "__main__":
-    check_database() 
\ No newline at end of file
+    check_database()
@@ -3,52 +3,52 @@
 Test script to verify Polymarket integration and pregame data retrieval.
 """
 
-import os
 import logging
-import psycopg2
 from dotenv import load_dotenv
-from polymarket_api import get_polymarket_data, calculate_live_iv, calculate_expected_iv
-import requests
+from db import get_db_connection
+from functools import lru_cache
+from scipy.special import ndtri
+from polymarket_api import get_polymarket_data, calculate_live_iv, calculate_expected_iv, search_nba_events
 from datetime import datetime
 from team_mapping import get_team_abbr
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL") or os.getenv("POSTGRES_URL")
 
-def get_db_connection():
-    """Get database connection."""
-    return psycopg2.connect(DATABASE_URL)
+@lru_cache(maxsize=4096)
+def pregame_iv_for(pregame_spread, pregame_prob):
+    """Pregame IV for a (spread, prob) pair; positions often share both."""
+    return abs(pregame_spread) / abs(ndtri(pregame_prob))
 
 def test_polymarket_data_retrieval():
     """Test retrieving data from Polymarket API."""
     # Test with a known slug
     slug = "nba-bkn-was-2025-02-24"
-    logging.info(f"Testing Polymarket data retrieval for slug: {slug}")
+    logger.info("Testing Polymarket data retrieval for slug: %s", slug)
     
     market_data = get_polymarket_data(slug)
     if not market_data:
-        logging.error(f"Failed to retrieve data for {slug}")
+        logger.error("Failed to retrieve data for %s", slug)
         return
     
-    logging.info("Successfully retrieved Polymarket data:")
-    logging.info(f"Event ID: {market_data['event_id']}")
-    logging.info(f"Teams: {market_data['away_team']} @ {market_data['home_team']}")
-    logging.info(f"Prices: Away={market_data['away_price']:.3f}, Home={market_data['home_price']:.3f}")
-    logging.info(f"Score Differential: {market_data['score_diff']}")
-    logging.info(f"Game Time: {market_data['game_time']:.2f}")
+    logger.info("Successfully retrieved Polymarket data:")
+    logger.info("Event ID: %s", market_data['event_id'])
+    logger.info("Teams: %s @ %s", market_data['away_team'], market_data['home_team'])
+    logger.info("Prices: Away=%.3f, Home=%.3f", market_data['away_price'], market_data['home_price'])
+    logger.info("Score Differential: %s", market_data['score_diff'])
+    logger.info("Game Time: %.2f", market_data['game_time'])
     
     # Test volatility calculations
     pregame_spread = 11.5  # Example value
     pregame_prob = 0.1746  # Example value
     
     # Calculate pregame IV
-    from scipy.stats import norm
-    pregame_iv = abs(pregame_spread) / abs(norm.ppf(pregame_prob))
-    logging.info(f"Pregame IV: {pregame_iv:.2f}")
+    pregame_iv = pregame_iv_for(pregame_spread, pregame_prob)
+    logger.info("Pregame IV: %.2f", pregame_iv)
     
     # Calculate live IV
     score_diff = market_data['score_diff'] or 0
@@ -58,16 +58,15 @@ def test_polymarket_data_retrieval():
     live_iv = calculate_live_iv(score_diff, pregame_spread, game_time, away_price)
     expected_iv = calculate_expected_iv(pregame_iv, game_time)
     
-    logging.info(f"Live IV: {live_iv:.2f}")
-    logging.info(f"Expected IV: {expected_iv:.2f}")
+    logger.info("Live IV: %.2f", live_iv)
+    logger.info("Expected IV: %.2f", expected_iv)
     
     return market_data
 
 def test_with_active_positions():
     """Test with active positions from database."""
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
+        with get_db_connection() as conn, conn.cursor() as cur:
             # Get active positions
             query = """
             SELECT id, condition_id, outcome, price, amount, num_shares, 
@@ -81,26 +80,27 @@ def test_with_active_positions():
             active_positions = cur.fetchall()
             
             if not active_positions:
-                logging.warning("No active positions found in database")
+                logger.warning("No active positions found in database")
                 return
             
-            logging.info(f"Found {len(active_positions)} active positions")
+            logger.info("Found %s active positions", len(active_positions))
             
             for position in active_positions:
                 (bet_id, condition_id, outcome, entry_price, amount, 
                  num_shares, model_prob, start_time) = position
                 
-                logging.info(f"\nTesting position {bet_id}:")
-                logging.info(f"Condition ID: {condition_id}")
-                logging.info(f"Team: {outcome}")
-                logging.info(f"Entry price: {entry_price:.3f}")
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("\nTesting position %s:", bet_id)
+                    logger.info("Condition ID: %s", condition_id)
+                    logger.info("Team: %s", outcome)
+                    logger.info("Entry price: %.3f", entry_price)
                 
                 # For testing, use a hardcoded slug
                 slug = "nba-bkn-was-2025-02-24"
                 market_data = get_polymarket_data(slug)
                 
                 if not market_data:
-                    logging.warning(f"No market data found for position {bet_id}")
+                    logger.warning("No market data found for position %s", bet_id)
                     continue
                 
                 # Determine if team is home or away
@@ -108,26 +108,25 @@ def test_with_active_positions():
                 is_away = outcome.lower() in market_data["away_team"].lower()
                 
                 if not (is_home or is_away):
-                    logging.warning(f"Team {outcome} not found in market data")
+                    logger.warning("Team %s not found in market data", outcome)
                     continue
                 
                 # Get current price
                 current_price = market_data["home_price"] if is_home else market_data["away_price"]
-                logging.info(f"Current price: {current_price:.3f}")
+                logger.info("Current price: %.3f", current_price)
                 
                 # Calculate PnL
                 pnl = (current_price - entry_price) * num_shares
                 pnl_percentage = (current_price - entry_price) / entry_price * 100
-                logging.info(f"PnL: ${pnl:.2f} ({pnl_percentage:+.1f}%)")
+                logger.info("PnL: $%.2f (%+.1f%%)", pnl, pnl_percentage)
                 
                 # Get pregame spread from database or use default
                 # In a real implementation, you would fetch this from your database
                 pregame_spread = 11.5  # Default value
                 
                 # Calculate pregame IV
-                from scipy.stats import norm
-                pregame_iv = abs(pregame_spread) / abs(norm.ppf(float(model_prob)))
-                logging.info(f"Pregame IV: {pregame_iv:.2f}")
+                pregame_iv = pregame_iv_for(pregame_spread, float(model_prob))
+                logger.info("Pregame IV: %.2f", pregame_iv)
                 
                 # Calculate live IV
                 score_diff = market_data['score_diff'] or 0
@@ -139,8 +138,8 @@ def test_with_active_positions():
                 live_iv = calculate_live_iv(score_diff, pregame_spread, game_time, current_price)
                 expected_iv = calculate_expected_iv(pregame_iv, game_time)
                 
-                logging.info(f"Live IV: {live_iv:.2f}")
-                logging.info(f"Expected IV: {expected_iv:.2f}")
+                logger.info("Live IV: %.2f", live_iv)
+                logger.info("Expected IV: %.2f", expected_iv)
                 
                 # Check if sell signal would be generated
                 if pnl > 0 and live_iv < expected_iv:
@@ -149,62 +148,57 @@ def test_with_active_positions():
                     max_shares_to_recover = amount / current_price
                     suggested_shares = min(suggested_shares, max_shares_to_recover)
                     
-                    logging.info(f"SELL SIGNAL: Sell {suggested_shares:.0f} shares at {current_price:.3f}")
+                    logger.info("SELL SIGNAL: Sell %.0f shares at %.3f", suggested_shares, current_price)
                 else:
-                    logging.info("No sell signal would be generated")
+                    logger.info("No sell signal would be generated")
     
     except Exception as e:
-        logging.error(f"Error testing with active positions: {e}")
-    finally:
-        conn.close()
+        logger.error("Error testing with active positions: %s", e)
 
 def test_with_specific_team(team_name):
     """Test finding and retrieving data for a specific team."""
-    logging.info(f"Testing search for team: {team_name}")
+    logger.info("Testing search for team: %s", team_name)
     
     # Get team abbreviation
     team_abbr = get_team_abbr(team_name)
     
     if not team_abbr:
-        logging.warning(f"Could not find abbreviation for {team_name}")
+        logger.warning("Could not find abbreviation for %s", team_name)
         return None
     
     # Search for games with this team
     today = datetime.now().strftime("%Y-%m-%d")
-    search_url = f"https://gamma-api.polymarket.com/events?tag=nba&search={team_abbr}"
     
     try:
-        logging.info(f"Searching for games with team {team_name} ({team_abbr})")
-        response = requests.get(search_url)
-        response.raise_for_status()
-        events = response.json()
+        logger.info("Searching for games with team %s (%s)", team_name, team_abbr)
+        events = search_nba_events(team_abbr)
         
         if not events:
-            logging.warning(f"No games found for {team_name}")
+            logger.warning("No games found for %s", team_name)
             return None
         
         # Use the first event found
         event = events[0]
         slug = event.get("slug")
-        logging.info(f"Found game with slug: {slug}")
+        logger.info("Found game with slug: %s", slug)
         
         # Get market data
         market_data = get_polymarket_data(slug)
         if not market_data:
-            logging.warning(f"Could not get market data for {slug}")
+            logger.warning("Could not get market data for %s", slug)
             return None
         
-        logging.info(f"Successfully retrieved data for {team_name}:")
-        logging.info(f"Event: {market_data['home_team']} vs {market_data['away_team']}")
-        logging.info(f"Prices: Home={market_data['home_price']:.3f}, Away={market_data['away_price']:.3f}")
+        logger.info("Successfully retrieved data for %s:", team_name)
+        logger.info("Event: %s vs %s", market_data['home_team'], market_data['away_team'])
+        logger.info("Prices: Home=%.3f, Away=%.3f", market_data['home_price'], market_data['away_price'])
         
         return market_data
     except Exception as e:
-        logging.error(f"Error searching for games: {e}")
+        logger.error("Error searching for games: %s", e)
         return None
 
 if __name__ == "__main__":
-    logging.info("Starting Polymarket integration test")
+    logger.info("Starting Polymarket integration test")
     
     # Test basic data retrieval
     market_data = test_polymarket_data_retrieval()
@@ -217,8 +211,8 @@ if __name__ == "__main__":
     team_name = "Jazz"
     team_data = test_with_specific_team(team_name)
     if team_data:
-        logging.info(f"Team data for {team_name}:")
-        logging.info(f"Event: {team_data['home_team']} vs {team_data['away_team']}")
-        logging.info(f"Prices: Home={team_data['home_price']:.3f}, Away={team_data['away_price']:.3f}")
+        logger.info("Team data for %s:", team_name)
+        logger.info("Event: %s vs %s", team_data['home_team'], team_data['away_team'])
+        logger.info("Prices: Home=%.3f, Away=%.3f", team_data['home_price'], team_data['away_price'])
     
-    logging.info("Test completed") 
\ No newline at end of file
+    logger.info("Test completed") 
\ No newline at end of file
@@ -0,0 +1,71 @@
+from agent_types import position_key
+from position_manager import PositionManager, _INITIAL_CAPACITY
+
+def _open(manager, event_id, side_index=0, live_vol=12.0, expected_vol=10.0, score_diff=0.0):
+    return manager.open_position(
+        event_id=event_id,
+        league="NBA",
+        side_index=side_index,
+        position_type="SELL_VOL",
+        size=0.1,
+        live_vol=live_vol,
+        expected_vol=expected_vol,
+        score_diff=score_diff,
+        current_prob=0.6
+    )
+
+def test_grows_past_initial_capacity():
+    manager = PositionManager()
+    n = 2 * _INITIAL_CAPACITY + 1
+    for event_id in range(n):
+        # Distinct initial deviations so a lost copy would show
+        _open(manager, event_id, live_vol=10.0 + event_id, expected_vol=10.0)
+
+    assert len(manager.active_positions) == n
+    assert len(set(manager._rows.values())) == n
+    assert len(manager._initial_dev) >= n
+
+    # Unchanged deviation: no position hits an exit, early rows included
+    keys = [(event_id, 0) for event_id in range(n)]
+    live = [10.0 + event_id for event_id in range(n)]
+    now_ns = manager.get_position(0, 0).entry_ns
+    assert manager.check_all_exits(keys, live, [10.0] * n, [0.0] * n, now_ns) == []
+
+    # Mean reversion is still detected for a row written before the growth
+    assert manager.check_exit_conditions(1, 0, 10.1, 10.0, 0.5, 0.6, 0.0, now_ns) == (True, "MEAN_REVERSION")
+
+def test_reopened_row_has_no_stale_exit_state():
+    manager = PositionManager()
+    first = _open(manager, 1, live_vol=12.0, expected_vol=10.0, score_diff=0.0)
+    row = manager._rows[position_key(1, 0)]
+    manager.close_position(1, 0, "TEST")
+
+    # A closed position is no longer checked
+    assert manager.check_all_exits([(1, 0)], [10.0], [10.0], [0.0], first.entry_ns) == []
+
+    # The next open reuses the freed row with its own entry values
+    second = _open(manager, 2, live_vol=15.0, expected_vol=10.0, score_diff=20.0)
+    assert manager._rows[position_key(2, 0)] == row
+    assert manager._initial_dev[row] == 5.0
+    assert manager._entry_score[row] == 20.0
+    assert manager._entry_ns[row] == second.entry_ns
+
+    # Same deviation and score as at entry: no exit, even though the first
+    # position's entry score (0) would have tripped the game-state check
+    assert manager.check_exit_conditions(2, 0, 15.0, 10.0, 0.5, 0.6, 20.0, second.entry_ns) == (False, "")
+
+def test_reopen_same_key_replaces_row():
+    manager = PositionManager()
+    _open(manager, 1, live_vol=12.0, expected_vol=10.0)
+    second = _open(manager, 1, live_vol=14.0, expected_vol=10.0)
+
+    assert len(manager._rows) == 1
+    row = manager._rows[position_key(1, 0)]
+    assert manager._initial_dev[row] == 4.0
+    assert manager.get_position(1, 0) is second
+
+if __name__ == "__main__":
+    test_grows_past_initial_capacity()
+    test_reopened_row_has_no_stale_exit_state()
+    test_reopen_same_key_replaces_row()
+    print("All position manager tests passed")
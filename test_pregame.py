@@ -1,12 +1,26 @@
 import logging
-from datetime import datetime
+import numpy as np
+from datetime import datetime, timedelta
 from typing import Dict, List
+from scipy.special import ndtri
 from agent_tools import get_db_connection
-from volatility_tools import compute_pregame_implied_vol
 from alerts import AlertManager
 
+# One block per game in format_pregame_summary
+_GAME_TEMPLATE = """
+{away_team} @ {home_team}
+Spread: {spread:+.1f}
+Home Vol: {home_vol:.2f} (${home_price:.2f})
+Away Vol: {away_vol:.2f} (${away_price:.2f})
+"""
+
 def get_upcoming_games() -> Dict[str, List[Dict]]:
     """Get upcoming games from the database."""
+    # Half-open [today, tomorrow) range so an index on timestamp_utc can be used
+    today = datetime.utcnow().date()
+    day_start = today.isoformat()
+    day_end = (today + timedelta(days=1)).isoformat()
+    
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("""
@@ -23,9 +37,9 @@ def get_upcoming_games() -> Dict[str, List[Dict]]:
             JOIN pregame_implied_vol p ON e.event_id = p.event_id
             WHERE e.game_clock IS NULL  -- Pregame only
             AND e.league IN ('NBA', 'NFL')
-            AND DATE(e.timestamp_utc) = DATE('now')
+            AND e.timestamp_utc >= ? AND e.timestamp_utc < ?
             ORDER BY e.league, e.event_id
-        """)
+        """, (day_start, day_end))
         rows = cursor.fetchall()
         
     # Group by league
@@ -45,38 +59,37 @@ def get_upcoming_games() -> Dict[str, List[Dict]]:
     
     return games_by_league
 
+def compute_pregame_vols(games: List[Dict]):
+    """
+    Implied vol |spread| / |Φ⁻¹(p)| for both sides of every game in one pass,
+    with p the home probability and 1 - p the away one.
+    """
+    n = len(games)
+    spreads = np.abs(np.fromiter((g["spread"] for g in games), dtype=np.float64, count=n))
+    probs = np.fromiter((g["current_prob"] for g in games), dtype=np.float64, count=n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        home_vols = spreads / np.abs(ndtri(probs))
+        away_vols = spreads / np.abs(ndtri(1 - probs))
+    return home_vols, away_vols
+
 def format_pregame_summary(games_by_league: Dict[str, List[Dict]]) -> str:
     """Format summary of pregame volatility calculations."""
-    summary = f"""
+    parts = [f"""
 📊 <b>Pregame Volatility Summary</b>
 {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}
 
-"""
+"""]
     for league in ["NBA", "NFL"]:
         games = games_by_league[league]
         if not games:
             continue
             
-        summary += f"\n<b>{league} Games ({len(games)})</b>\n"
-        for game in games:
-            # Compute implied vol for both sides
-            home_vol = compute_pregame_implied_vol(
-                spread=game["spread"],
-                moneyline_prob=game["current_prob"]
-            )
-            away_vol = compute_pregame_implied_vol(
-                spread=-game["spread"],  # Flip sign for away
-                moneyline_prob=1 - game["current_prob"]
-            )
-            
-            summary += f"""
-{game['away_team']} @ {game['home_team']}
-Spread: {game['spread']:+.1f}
-Home Vol: {home_vol:.2f} (${game['home_price']:.2f})
-Away Vol: {away_vol:.2f} (${game['away_price']:.2f})
-"""
+        parts.append(f"\n<b>{league} Games ({len(games)})</b>\n")
+        home_vols, away_vols = compute_pregame_vols(games)
+        for game, home_vol, away_vol in zip(games, home_vols, away_vols):
+            parts.append(_GAME_TEMPLATE.format_map(dict(game, home_vol=home_vol, away_vol=away_vol)))
     
-    return summary
+    return "".join(parts)
 
 def main():
     logging.basicConfig(level=logging.INFO)
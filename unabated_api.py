@@ -1,11 +1,19 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 import os
+import queue
+import random
+import threading
+from itertools import chain
+from operator import itemgetter
 from datetime import datetime
 import logging
-import json
+import orjson
 import sqlite3
 from typing import Dict, List
+from cache import ttl_cache
 from team_mapping import NBA_TEAM_IDS, get_team_abbr, get_team_name
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -15,14 +23,68 @@ API_KEY = os.getenv("UNABATED_API_KEY")  # From .env
 BASE_URL = "https://partner-api.unabated.com/api"
 DB_FILE = "unabated_odds.db"
 
+# Market lookups reuse one snapshot for this many seconds; run() always fetches fresh
+SNAPSHOT_CACHE_TTL = 30
+
+# run() polls every POLL_INTERVAL seconds, stretching to MAX_POLL_INTERVAL
+# while polls come back empty; jitter keeps restarts from polling in lockstep
+POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 10.0
+POLL_BACKOFF = 1.5
+POLL_JITTER = 0.1
+# Parsed change batches waiting for the writer thread
+WRITE_QUEUE_SIZE = 8
+
+# run() polls continuously, so keep one TLS connection alive instead of
+# handshaking per request; (connect, read) seconds
+REQUEST_TIMEOUT = (3.05, 10)
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+))
+
+# WAL makes synchronous=NORMAL safe: commits no longer fsync, only checkpoints do
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "cache_size=-65536",  # 64 MiB
+    "mmap_size=268435456",  # 256 MiB
+    "wal_autocheckpoint=1000",
+)
+
+# One connection for the whole process, opened on first use, so the run()
+# loop doesn't reconnect and re-warm the page cache every second
+_conn = None
+_conn_lock = threading.Lock()
+
 def get_db_connection():
-    """Get a database connection."""
-    return sqlite3.connect(DB_FILE)
+    """Get the shared database connection. Callers must not close it."""
+    global _conn
+    if _conn is None:
+        with _conn_lock:
+            if _conn is None:
+                conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+                for pragma in SQLITE_PRAGMAS:
+                    conn.execute(f"PRAGMA {pragma}")
+                _conn = conn
+    return _conn
+
+def close_db_connection():
+    """Close the shared database connection; the next get reopens it."""
+    global _conn
+    with _conn_lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
 
 def reset_database():
     """Reset database by deleting and recreating it."""
     try:
         # Delete existing database
+        close_db_connection()
         if os.path.exists(DB_FILE):
             os.remove(DB_FILE)
             logging.info(f"Deleted existing database: {DB_FILE}")
@@ -51,6 +113,9 @@ BET_TYPES = {
     3: "Total"
 }
 
+# "bt{n}" keys as they appear in the market line data
+BET_TYPE_KEYS = {f"bt{n}": n for n in BET_TYPES}
+
 SIDE_INDEX = {
     0: "away/over",
     1: "home/under"
@@ -84,7 +149,6 @@ def init_database():
         # Create game_odds table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS game_odds (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
                 event_id TEXT NOT NULL,
                 timestamp_utc TEXT NOT NULL,
                 bet_type TEXT NOT NULL,  -- 1=moneyline, 2=spread, 3=total
@@ -94,8 +158,8 @@ def init_database():
                 price REAL NOT NULL,  -- Price in source format
                 game_clock TEXT,  -- Format: "12:00 1H", "7:23 4Q" etc
                 score_difference INTEGER,  -- Positive = home leading
-                UNIQUE(event_id, timestamp_utc, bet_type, side_index)
-            )
+                PRIMARY KEY (event_id, timestamp_utc, bet_type, side_index)
+            ) WITHOUT ROWID
         """)
         
         # Create pregame_volatilities table for storing computed vols
@@ -119,8 +183,6 @@ def init_database():
         logging.error(f"Error initializing database: {e}")
         conn.rollback()
         raise
-    finally:
-        conn.close()
 
 MARKET_SOURCES = {
     1: "Pinnacle",
@@ -148,51 +210,110 @@ MARKET_SOURCES = {
     92: "Unibet"
 }
 
+# Decoded market line keys; the same few keys repeat across every event
+_MARKET_KEY_CACHE: Dict[str, tuple] = {}
+
+def _parse_market_key(key: str):
+    """Split a "si{side}:ms{source}..." key into (side, source), or None if malformed."""
+    try:
+        return _MARKET_KEY_CACHE[key]
+    except KeyError:
+        pass
+    parts = key.split(':')
+    parsed = (int(parts[0].replace('si', '')), int(parts[1].replace('ms', ''))) if len(parts) >= 2 else None
+    _MARKET_KEY_CACHE[key] = parsed
+    return parsed
+
+# Fields every stored line needs; a missing one skips the line like a null does
+_line_fields = itemgetter('points', 'sourcePrice', 'sourceFormat')
+
 def parse_game_odds_events(data):
-    """Parse game odds events from Unabated API response."""
+    """
+    Parse game odds events from a snapshot or changes response into game_odds rows:
+    (event_id, timestamp_utc, bet_type, side_index, source_format, points,
+    price, game_clock, score_difference)
+    """
     events = []
     
-    game_odds_events = data.get('results', [{}])[0].get('gameOdds', {}).get('gameOddsEvents', {})
+    # A snapshot carries gameOddsEvents at the top level; a changes response
+    # carries one per result, oldest first, so later rows win the upsert
+    if 'gameOddsEvents' in data:
+        sections = [data['gameOddsEvents']]
+    else:
+        sections = [result.get('gameOdds', {}).get('gameOddsEvents', {}) for result in data.get('results', [])]
     
-    for league_period_key, events_list in game_odds_events.items():
-        for event in events_list:
-            event_id = event.get('eventId')
-            event_start = event.get('eventStart')
-            status_id = event.get('statusId')
-            game_clock = event.get('gameClock')
+    for game_odds_events in sections:
+        for league_period_key, events_list in game_odds_events.items():
+            for event in events_list:
+                event_id = event.get('eventId')
+                event_start = event.get('eventStart')
+                game_clock = event.get('gameClock')
             
-            if not event_id:
-                continue
+                if not event_id:
+                    continue
                 
-            market_lines = event.get('gameOddsMarketSourcesLines', {})
-            for market_key, bet_types in market_lines.items():
-                for bet_type, line in bet_types.items():
-                    if bet_type != 'bt2':
+                market_lines = event.get('gameOddsMarketSourcesLines', {})
+                for market_key, bet_types in market_lines.items():
+                    # Only spreads are stored
+                    line = bet_types.get('bt2')
+                    if line is None:
+                        continue
+                    try:
+                        points, price, source_format = _line_fields(line)
+                    except KeyError:
                         continue
-                    points = line.get('points')
-                    price = line.get('sourcePrice')
-                    source_format = line.get('sourceFormat')
                     modified_on = line.get('modifiedOn')
+                
+                    if points is None or price is None or source_format is None:
+                        continue
                     
-                    if None in [points, price, source_format]:
+                    parsed_key = _parse_market_key(market_key)
+                    if parsed_key is None:
                         continue
-                        
-                    events.append({
-                        'event_id': str(event_id),
-                        'timestamp_utc': modified_on or event_start,
-                        'bet_type': bet_type.replace('bt', ''),
-                        'side_index': int(market_key.replace('si','').split(':')[0]),
-                        'source_format': source_format,
-                        'points': float(points) if points is not None else None,
-                        'price': float(price),
-                        'game_clock': game_clock,
-                        'score_difference': None
-                    })
+                    
+                    # Row in game_odds column order. Values stay as decoded;
+                    # the TEXT/REAL column affinities convert ids and prices on insert
+                    events.append((
+                        event_id,
+                        modified_on or event_start,
+                        '2',
+                        parsed_key[0],
+                        source_format,
+                        points,
+                        price,
+                        game_clock,
+                        None
+                    ))
     
     return events
 
+# Rows per multi-row INSERT; 100 rows x 9 columns stays under the 999
+# bound-variable limit of older SQLite builds
+GAME_ODDS_CHUNK_ROWS = 100
+
+def _game_odds_upsert(n_rows):
+    """
+    Multi-row game_odds INSERT for n_rows rows. Conflicts update the existing
+    row in place, rather than INSERT OR REPLACE's delete + reinsert.
+    """
+    values = ", ".join(["(?, ?, ?, ?, ?, ?, ?, ?, ?)"] * n_rows)
+    return f"""
+    INSERT INTO game_odds (
+        event_id, timestamp_utc, bet_type, side_index, 
+        source_format, points, price, game_clock, score_difference
+    ) VALUES {values}
+    ON CONFLICT (event_id, timestamp_utc, bet_type, side_index) DO UPDATE SET
+        source_format = excluded.source_format,
+        points = excluded.points,
+        price = excluded.price,
+        game_clock = excluded.game_clock,
+        score_difference = excluded.score_difference
+    """
+
+GAME_ODDS_CHUNK_UPSERT = _game_odds_upsert(GAME_ODDS_CHUNK_ROWS)
+
 def store_game_odds(events):
-    """Store game odds in the database."""
+    """Store game odds rows from parse_game_odds_events in the database."""
     if not events:
         return
         
@@ -200,43 +321,80 @@ def store_game_odds(events):
     cursor = conn.cursor()
     
     try:
-        cursor.executemany("""
-            INSERT OR REPLACE INTO game_odds (
-                event_id, timestamp_utc, bet_type, side_index, 
-                source_format, points, price, game_clock, score_difference
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, [
-            (
-                e['event_id'], e['timestamp_utc'], e['bet_type'], 
-                e['side_index'], e['source_format'], e['points'],
-                e['price'], e['game_clock'], e['score_difference']
-            ) for e in events
-        ])
+        # Take the write lock up front so the batch can't fail halfway on a busy database
+        cursor.execute("BEGIN IMMEDIATE")
+        for start in range(0, len(events), GAME_ODDS_CHUNK_ROWS):
+            chunk = events[start:start + GAME_ODDS_CHUNK_ROWS]
+            sql = GAME_ODDS_CHUNK_UPSERT if len(chunk) == GAME_ODDS_CHUNK_ROWS else _game_odds_upsert(len(chunk))
+            cursor.execute(sql, list(chain.from_iterable(chunk)))
         
         conn.commit()
-        print(f"Stored {len(events)} events in database")
+        logging.info("Stored %d events in database", len(events))
         
     except Exception as e:
-        print(f"Error storing events: {e}")
+        logging.error("Error storing events: %s", e)
         conn.rollback()
-    finally:
-        conn.close()
 
-def fetch_snapshot():
-    url = f"{BASE_URL}/markets/gameOdds"
-    headers = {"x-api-key": API_KEY}
+def _api_get(path: str, api_key: str) -> dict:
+    """GET an Unabated API path on the shared session and decode it; raises on failure."""
+    # Key goes in the header rather than the URL so it stays out of logged URLs
+    response = _session.get(f"{BASE_URL}{path}", headers={"x-api-key": api_key}, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+def fetch_snapshot(store=store_game_odds):
+    """
+    Fetch the full game odds snapshot and pass the parsed rows to store.
     
+    Returns:
+        the snapshot's lastTimestamp to poll changes from, or None on failure
+    """
     try:
         logging.info("Fetching snapshot...")
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json()
+        data = _api_get("/markets/gameOdds", API_KEY)
+        events = parse_game_odds_events(data)
+        if events:
+            store(events)
         logging.info("Snapshot fetched successfully.")
-        return data
+        return data.get('lastTimestamp')
     except Exception as e:
         logging.error(f"Error fetching snapshot: {e}")
         return None
 
+@ttl_cache(ttl=SNAPSHOT_CACHE_TTL, maxsize=1)
+def _fetch_live_snapshot(api_key: str) -> dict:
+    """Fetch the game-odds snapshot used by the market lookups; raises on failure."""
+    return _api_get("/markets/gameOdds", api_key)
+
+# Lookup tables for the most recent snapshot's NBA events, as (events, index)
+_nba_index = (None, None)
+
+def _index_nba_events(nba_events: list) -> dict:
+    """Index one snapshot's NBA events; rebuilt only when the snapshot changes."""
+    global _nba_index
+    cached_events, index = _nba_index
+    if cached_events is nba_events:
+        return index
+        
+    by_id = {}
+    by_abbr = {}
+    by_name = {}
+    for pos, evt in enumerate(nba_events):
+        # First occurrence wins, as in a linear scan
+        by_id.setdefault(str(evt.get("eventId")), evt)
+        
+        # Team keys keep the event's position so the earliest match can be picked
+        for side in ("homeTeam", "awayTeam"):
+            team = evt.get(side, {})
+            abbr = NBA_TEAM_IDS.get(team.get("id"))
+            if abbr:
+                by_abbr.setdefault(abbr, (pos, evt))
+            by_name.setdefault(team.get("name", "").lower(), (pos, evt))
+        
+    index = {"by_id": by_id, "by_abbr": by_abbr, "by_name": by_name}
+    _nba_index = (nba_events, index)
+    return index
+
 # ----------------------
 # NEW FUNCTION: get_live_market_data
 # ----------------------
@@ -259,10 +417,7 @@ def get_live_market_data(event_id: str, team_name: str = None) -> dict:
             return None
             
         # Get snapshot of all markets
-        url = f"https://partner-api.unabated.com/api/markets/gameOdds?x-api-key={api_key}"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+        data = _fetch_live_snapshot(api_key)
         
         # Only look at NBA games (league ID 3)
         nba_pregame_key = "lg3:pt1:pregame"
@@ -273,45 +428,32 @@ def get_live_market_data(event_id: str, team_name: str = None) -> dict:
         nba_events = data["gameOddsEvents"][nba_pregame_key]
         logging.info(f"Found {len(nba_events)} NBA events")
         
+        index = _index_nba_events(nba_events)
+        
         # Try to find the event by ID
-        event = None
-        for evt in nba_events:
-            if str(evt.get("eventId")) == event_id:
-                event = evt
-                break
+        event = index["by_id"].get(event_id)
                 
         # If not found by ID, try alternative formats
         if not event and event_id:
             # Try hex format
-            for evt in nba_events:
-                if evt.get("eventId") == int(event_id, 16):
-                    event = evt
-                    break
+            try:
+                event = index["by_id"].get(str(int(event_id, 16)))
+            except ValueError:
+                pass
         
         # If still not found and we have a team name, try to match by team
         if not event and team_name:
             team_abbr = get_team_abbr(team_name)
+            by_abbr = index["by_abbr"].get(team_abbr) if team_abbr else None
+            by_name = index["by_name"].get(team_name.lower())
             
-            for evt in nba_events:
-                home_team_id = evt.get("homeTeam", {}).get("id")
-                away_team_id = evt.get("awayTeam", {}).get("id")
-                
-                home_abbr = NBA_TEAM_IDS.get(home_team_id)
-                away_abbr = NBA_TEAM_IDS.get(away_team_id)
-                
-                if team_abbr in [home_abbr, away_abbr]:
-                    event = evt
-                    logging.info(f"Found event by team abbreviation: {team_abbr}")
-                    break
-                    
-                # Try by full name
-                home_name = evt.get("homeTeam", {}).get("name", "").lower()
-                away_name = evt.get("awayTeam", {}).get("name", "").lower()
-                
-                if team_name.lower() in [home_name, away_name]:
-                    event = evt
-                    logging.info(f"Found event by team name: {team_name}")
-                    break
+            # Whichever match comes first in the snapshot wins
+            if by_abbr and (not by_name or by_abbr[0] <= by_name[0]):
+                event = by_abbr[1]
+                logging.info(f"Found event by team abbreviation: {team_abbr}")
+            elif by_name:
+                event = by_name[1]
+                logging.info(f"Found event by team name: {team_name}")
                     
         # If still not found, give up
         if not event:
@@ -365,37 +507,76 @@ def get_live_market_data(event_id: str, team_name: str = None) -> dict:
         logging.error(f"Error fetching live market data: {str(e)}")
         return None
 
-def fetch_changes(last_timestamp):
-    """Fetch changes since last timestamp (if needed)."""
+def fetch_changes(last_timestamp, store=store_game_odds):
+    """
+    Fetch changes since last timestamp and pass the parsed rows to store.
+    
+    Returns:
+        (new last timestamp, number of events stored). If the request errors
+        the old timestamp comes back so the next poll retries it; None means
+        the timestamp went stale and a full snapshot is needed
+    """
     try:
-        url = f"{BASE_URL}/markets/changes"
+        path = "/markets/changes"
         if last_timestamp:
-            url += f"/{last_timestamp}"
-        headers = {"x-api-key": API_KEY}
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json()
+            path += f"/{last_timestamp}"
+        data = _api_get(path, API_KEY)
         if data.get('resultCode') == 'Failed':
-            print("Changes request failed - need to fetch full snapshot")
-            return None
+            logging.warning("Changes request failed - need to fetch full snapshot")
+            return None, 0
         events = parse_game_odds_events(data)
-        store_game_odds(events)
-        return data.get('lastTimestamp')
+        if events:
+            store(events)
+        return data.get('lastTimestamp'), len(events)
     except Exception as e:
-        print(f"Error fetching changes: {e}")
-        return None
+        logging.error("Error fetching changes: %s", e)
+        return last_timestamp, 0
+
+# Put on the write queue to stop the writer once earlier batches are stored
+_STOP_WRITER = None
+
+def _odds_writer(write_queue):
+    """Drain parsed change batches into the database, one at a time."""
+    while True:
+        events = write_queue.get()
+        try:
+            if events is _STOP_WRITER:
+                return
+            store_game_odds(events)
+        finally:
+            write_queue.task_done()
 
 def run():
     """Main run loop to continuously fetch odds."""
     reset_database()
-    last_timestamp = fetch_snapshot()
-    while True:
-        new_timestamp = fetch_changes(last_timestamp)
-        if new_timestamp is None:
-            last_timestamp = fetch_snapshot()
-        else:
-            last_timestamp = new_timestamp
-        time.sleep(1)
+    
+    # Writes happen on a background thread so the next poll doesn't wait on
+    # SQLite; the bounded queue makes polling block if writes fall behind
+    write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+    writer = threading.Thread(target=_odds_writer, args=(write_queue,), name="odds-writer", daemon=True)
+    writer.start()
+    
+    try:
+        last_timestamp = fetch_snapshot(store=write_queue.put)
+        poll_interval = POLL_INTERVAL
+        while True:
+            new_timestamp, n_events = fetch_changes(last_timestamp, store=write_queue.put)
+            if new_timestamp is None:
+                # Stale timestamp; start over from a full snapshot
+                last_timestamp = fetch_snapshot(store=write_queue.put)
+            else:
+                last_timestamp = new_timestamp
+            # Back off while nothing is changing (e.g. overnight), snap back on activity
+            if n_events:
+                poll_interval = POLL_INTERVAL
+            else:
+                poll_interval = min(poll_interval * POLL_BACKOFF, MAX_POLL_INTERVAL)
+            time.sleep(poll_interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER))
+    finally:
+        # On exit or Ctrl-C, store the batches already queued before closing
+        write_queue.put(_STOP_WRITER)
+        writer.join()
+        close_db_connection()
 
 def find_event_by_teams(data: dict, team_name: str) -> dict:
     """Try to find event by matching team names."""
@@ -427,7 +608,11 @@ def get_live_market_data_by_team(team_name: str) -> dict:
     Fetch live market data by searching for a team name.
     """
     logging.info(f"Fetching live market data for team: {team_name}")
-    data = fetch_snapshot()
+    try:
+        data = _fetch_live_snapshot(os.getenv("UNABATED_API_KEY"))
+    except Exception as e:
+        logging.error(f"Error fetching snapshot: {e}")
+        data = None
     if not data:
         logging.error("Failed to fetch snapshot from API")
         return None
@@ -460,15 +645,14 @@ def get_live_market_data_by_team(team_name: str) -> dict:
     }
     
     for key_line, line_data in market_lines.items():
-        parts = key_line.split(':')
-        if len(parts) < 2:
+        parsed_key = _parse_market_key(key_line)
+        if parsed_key is None:
             continue
             
-        side = int(parts[0].replace('si', ''))  # 0=away/over, 1=home/under
-        sportsbook = int(parts[1].replace('ms', ''))
+        side, sportsbook = parsed_key  # side: 0=away/over, 1=home/under
         
         for bet_type, details in line_data.items():
-            bet_type_id = int(bet_type.replace('bt', ''))
+            bet_type_id = BET_TYPE_KEYS.get(bet_type)
             
             if bet_type_id == 1:  # Moneyline
                 if side == 1:  # Home